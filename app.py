@@ -3,16 +3,13 @@ Main Streamlit application for Singapore Work Pass Chatbot
 """
 import streamlit as st
 import os
+import threading
 from pathlib import Path
-import sys
 from dotenv import load_dotenv
-import pandas as pd
-from rag_engine import RAGEngine
 import config
+import page_content
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -26,42 +23,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def load_css() -> str:
+    """Read the app stylesheet once per process"""
+    css = (Path(__file__).parent / "assets" / "style.css").read_text(encoding="utf-8")
+    return f"<style>\n{css}</style>"
+
 # Custom CSS
-st.markdown("""
-    <style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .chat-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-    }
-    .assistant-message {
-        background-color: #f5f5f5;
-    }
-    .source-link {
-        color: #1976d2;
-        text-decoration: none;
-    }
-    .source-link:hover {
-        text-decoration: underline;
-    }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Initialize session state
-if 'rag_engine' not in st.session_state:
-    st.session_state.rag_engine = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'user_context' not in st.session_state:
+    st.session_state.user_context = {}
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 
@@ -83,86 +58,119 @@ def check_password():
         return False
     return True
 
+@st.cache_resource(show_spinner=False)
+def get_rag_engine():
+    """Create the RAG engine once per process and share it across all sessions"""
+    # Imported here so langchain/chromadb only load once the engine is needed, not for the login page
+    from rag_engine import RAGEngine
+    
+    rag_engine = RAGEngine(auto_build=True)
+    if config.WARMUP:
+        # In the background, so the first page load doesn't wait for it
+        threading.Thread(target=rag_engine.warm_up, args=(config.WARMUP_QUESTIONS,), daemon=True).start()
+    return rag_engine
+
 def initialize_rag_engine():
-    """Initialize RAG engine if not already initialized"""
-    if st.session_state.rag_engine is None:
-        try:
-            # Check if we need to build the knowledge base
-            vector_db_path = Path("./chroma_db")
-            processed_file = Path("processed_knowledge_base.json")
-            
-            if not vector_db_path.exists() and processed_file.exists():
-                # Show a more informative message for auto-build
-                with st.spinner("Building knowledge base from processed data (this may take a few minutes on first run)..."):
-                    st.session_state.rag_engine = RAGEngine(auto_build=True)
-            else:
-                with st.spinner("Loading knowledge base..."):
-                    st.session_state.rag_engine = RAGEngine(auto_build=True)
-            return True
-        except Exception as e:
-            st.error(f"Error initializing RAG engine: {str(e)}")
-            if "processed_knowledge_base.json" in str(e):
-                st.info("Please ensure processed_knowledge_base.json exists in the project root.")
-            else:
-                st.info("If the knowledge base needs to be built, ensure processed_knowledge_base.json exists, or run: `python knowledge_base/builder.py`")
-            return False
-    return True
+    """Get the shared RAG engine, returning None if it could not be initialized"""
+    try:
+        # Check if we need to build the knowledge base
+        vector_db_path = Path("./chroma_db")
+        processed_file = Path("processed_knowledge_base.json")
+        
+        if not vector_db_path.exists() and processed_file.exists():
+            # Show a more informative message for auto-build
+            spinner_text = "Building knowledge base from processed data (this may take a few minutes on first run)..."
+        else:
+            spinner_text = "Loading knowledge base..."
+        
+        with st.spinner(spinner_text):
+            return get_rag_engine()
+    except Exception as e:
+        st.error(f"Error initializing RAG engine: {str(e)}")
+        if "processed_knowledge_base.json" in str(e):
+            st.info("Please ensure processed_knowledge_base.json exists in the project root.")
+        else:
+            st.info("If the knowledge base needs to be built, ensure processed_knowledge_base.json exists, or run: `python knowledge_base/builder.py`")
+        return None
 
 def chat_page():
     """Main chat interface page"""
     st.markdown('<h1 class="main-header">🇸🇬 Singapore Work Pass Assistant</h1>', unsafe_allow_html=True)
     st.markdown("### Ask questions about Singapore work passes")
     
-    if not initialize_rag_engine():
+    rag_engine = initialize_rag_engine()
+    if rag_engine is None:
         return
     
-    # User context sidebar
-    with st.sidebar:
+    # User context sidebar - a form so editing the profile only reruns the page once, on save
+    saved_context = st.session_state.user_context
+    with st.sidebar, st.form("profile_form"):
         st.header("📋 Your Profile (Optional)")
         st.markdown("Provide context to get personalized answers")
         
         nationality = st.selectbox(
             "Nationality",
-            ["Select...", "Singaporean", "Malaysian", "Indian", "Chinese", "Filipino", "Indonesian", "Other"]
+            config.NATIONALITY_OPTIONS,
+            index=config.NATIONALITY_OPTIONS.index(saved_context.get("nationality", "Select..."))
         )
         
         current_pass = st.selectbox(
             "Current Pass Type (if any)",
-            ["None", "Employment Pass", "S Pass", "Work Permit", "Student Pass", "Other"]
+            config.CURRENT_PASS_OPTIONS,
+            index=config.CURRENT_PASS_OPTIONS.index(saved_context.get("current_pass", "None"))
         )
         
         salary_range = st.selectbox(
             "Expected Salary Range (SGD)",
-            ["Select...", "Below 3,000", "3,000 - 5,000", "5,000 - 10,000", "10,000 - 15,000", "Above 15,000"]
+            config.SALARY_RANGE_OPTIONS,
+            index=config.SALARY_RANGE_OPTIONS.index(saved_context.get("salary_range", "Select..."))
         )
         
-        user_context = {}
-        if nationality != "Select...":
-            user_context["nationality"] = nationality
-        if current_pass != "None":
-            user_context["current_pass"] = current_pass
-        if salary_range != "Select...":
-            user_context["salary_range"] = salary_range
+        if st.form_submit_button("Save profile"):
+            user_context = {}
+            if nationality != "Select...":
+                user_context["nationality"] = nationality
+            if current_pass != "None":
+                user_context["current_pass"] = current_pass
+            if salary_range != "Select...":
+                user_context["salary_range"] = salary_range
+            st.session_state.user_context = user_context
     
     # Chat interface
     st.markdown("---")
-    
-    # Display chat history
-    for message in st.session_state.chat_history:
-        if message["role"] == "user":
-            st.markdown(f'<div class="chat-message user-message"><strong>You:</strong> {message["content"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="chat-message assistant-message"><strong>Assistant:</strong> {message["content"]}</div>', unsafe_allow_html=True)
-            
-            # Show sources if available
-            if "sources" in message and message["sources"]:
-                with st.expander("📚 Sources"):
-                    for i, source in enumerate(message["sources"][:3], 1):
-                        st.markdown(f"{i}. **{source['title']}**")
-                        if source['url']:
-                            st.markdown(f"   [View source]({source['url']})")
-                        if source['pass_type'] != "General":
-                            st.caption(f"Pass Type: {source['pass_type']}")
+    chat_section(rag_engine, st.session_state.user_context)
+
+def render_sources(sources: list):
+    """Render the top source citations for an answer"""
+    with st.expander("📚 Sources"):
+        for i, source in enumerate(sources[:3], 1):
+            st.markdown(f"{i}. **{source['title']}**")
+            if source['url']:
+                st.markdown(f"   [View source]({source['url']})")
+            if source['pass_type'] != "General":
+                st.caption(f"Pass Type: {source['pass_type']}")
+
+def render_message(message: dict):
+    """Render a single chat message and its sources"""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        
+        # Show sources if available
+        if message.get("sources"):
+            render_sources(message["sources"])
+
+@st.fragment
+def chat_section(rag_engine, user_context: dict):
+    """Chat history and input, rerun on its own so asking a question doesn't rerun the whole page"""
+    # Display chat history - only the most recent messages unless asked, so the per-rerun
+    # render cost stays bounded as the conversation grows. New messages are drawn in place
+    # below, so a submitted question never re-renders the history a second time.
+    history = st.session_state.chat_history
+    hidden = max(len(history) - config.CHAT_HISTORY_DISPLAY_LIMIT, 0)
+    if hidden and not st.toggle("Show earlier messages", key="show_earlier_messages"):
+        history = history[hidden:]
+    for message in history:
+        render_message(message)
     
     # Chat input
     user_question = st.chat_input("Ask a question about Singapore work passes...")
@@ -171,9 +179,18 @@ def chat_page():
         # Add user message to history
         st.session_state.chat_history.append({"role": "user", "content": user_question})
         
-        # Get response from RAG engine
-        with st.spinner("Thinking..."):
-            result = st.session_state.rag_engine.query(user_question, user_context)
+        # Show the question while the answer is being generated
+        with st.chat_message("user"):
+            st.markdown(user_question)
+        
+        with st.chat_message("assistant"):
+            # Stream the response from the RAG engine (cached answers arrive in one piece)
+            with st.spinner("Thinking..."):
+                answer_stream, sources = rag_engine.stream_query(user_question, user_context)
+            result = {"answer": st.write_stream(answer_stream), "sources": sources}
+            
+            if result["sources"]:
+                render_sources(result["sources"])
         
         # Add assistant response to history
         st.session_state.chat_history.append({
@@ -181,15 +198,14 @@ def chat_page():
             "content": result["answer"],
             "sources": result["sources"]
         })
-        
-        st.rerun()
 
 def search_page():
     """Intelligent search page"""
     st.markdown('<h1 class="main-header">🔍 Intelligent Search</h1>', unsafe_allow_html=True)
     st.markdown("### Search the knowledge base for specific information")
     
-    if not initialize_rag_engine():
+    rag_engine = initialize_rag_engine()
+    if rag_engine is None:
         return
     
     # Search interface
@@ -204,7 +220,7 @@ def search_page():
     if st.button("Search", type="primary") or search_query:
         if search_query:
             with st.spinner("Searching knowledge base..."):
-                results = st.session_state.rag_engine.search(search_query, top_k=num_results)
+                results = rag_engine.search(search_query, top_k=num_results)
             
             if results:
                 st.markdown(f"### Found {len(results)} relevant results")
@@ -226,285 +242,19 @@ def search_page():
 def about_page():
     """About Us page"""
     st.markdown('<h1 class="main-header">ℹ️ About Us</h1>', unsafe_allow_html=True)
-    
-    st.markdown("""
-    ## Project Overview
-    
-    The Singapore Work Pass Assistant is an LLM-powered web application designed to help citizens 
-    and foreign workers understand Singapore work passes by providing accurate, up-to-date information 
-    from official Ministry of Manpower (MOM) sources.
-    
-    ## Objectives
-    
-    1. **Consolidate Information**: Aggregate data from official MOM sources to provide a unified 
-       repository of work pass information
-    
-    2. **Personalize User Experience**: Allow users to provide context (nationality, salary range, etc.) 
-       to receive tailored guidance relevant to their specific scenarios
-    
-    3. **Enhance Understanding**: Generate interactive content, explanations, and responses to 
-       follow-up questions to facilitate deeper comprehension
-    
-    4. **Present Information Effectively**: Present information through various formats including 
-       text, tables, visualizations, and interactive forms
-    
-    ## Data Sources
-    
-    All information is retrieved from official and publicly accessible sources:
-    
-    - **Ministry of Manpower Singapore (MOM)**: https://www.mom.gov.sg
-    - **MOM Passes and Permits Portal**: https://www.mom.gov.sg/passes-and-permits
-    
-    The knowledge base is built by scraping and processing official MOM web pages to ensure 
-    accuracy and reliability.
-    
-    ## Features
-    
-    ### 1. Chat Interface
-    - Interactive Q&A powered by RAG (Retrieval-Augmented Generation)
-    - Context-aware responses based on user profile
-    - Source citations for transparency
-    
-    ### 2. Intelligent Search
-    - Semantic search across the knowledge base
-    - Relevance-ranked results
-    - Detailed document previews
-    
-    ### 3. Personalized Guidance
-    - User profile collection (nationality, current pass, salary range)
-    - Contextualized responses
-    - Scenario-specific information
-    
-    ## Technology Stack
-    
-    - **Frontend**: Streamlit
-    - **LLM**: OpenAI GPT-4o-mini
-    - **Vector Database**: ChromaDB
-    - **Embeddings**: OpenAI text-embedding-3-small
-    - **RAG Framework**: LangChain
-    
-    ## Work Pass Coverage
-    
-    The application covers information about:
-    
-    - Employment Pass (EP)
-    - Personalised Employment Pass (PEP)
-    - EntrePass
-    - S Pass
-    - Work Permits (various types)
-    - Foreign Domestic Worker (FDW) permits
-    - Training Employment Pass
-    - Work Holiday Pass
-    - Dependant's Pass
-    - Long-Term Visit Pass (LTVP)
-    - And other related passes and permits
-    
-    ## Disclaimer
-    
-    This application provides information based on publicly available MOM sources. For official 
-    applications, renewals, or specific queries, users should always refer to the official 
-    MOM website or contact MOM directly.
-    """)
+    st.markdown(page_content.ABOUT_MD)
 
 def methodology_page():
     """Methodology page with flowcharts"""
     st.markdown('<h1 class="main-header">🔬 Methodology</h1>', unsafe_allow_html=True)
-    
-    st.markdown("""
-    ## System Architecture
-    
-    The application uses a Retrieval-Augmented Generation (RAG) architecture to provide accurate 
-    answers about Singapore work passes.
-    """)
-    
-    # Use Case 1: Chat with Information
-    st.markdown("### Use Case 1: Chat with Information")
-    
-    st.markdown("""
-    **Process Flow:**
-    
-    1. User submits a question through the chat interface
-    2. Optional user context (nationality, salary, etc.) is collected
-    3. Question is enhanced with user context
-    4. RAG engine performs semantic search in vector database
-    5. Top 5 relevant document chunks are retrieved
-    6. Retrieved context is passed to LLM with prompt template
-    7. LLM generates answer based on retrieved context
-    8. Answer and source citations are returned to user
-    9. Conversation history is maintained for context
-    """)
-    
-    # Simple flowchart representation using text
-    st.code("""
-    ┌─────────────┐
-    │ User Query  │
-    └──────┬──────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Collect User Context│
-    │ (Optional)          │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Enhance Query       │
-    │ with Context        │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Vector DB Search    │
-    │ (Semantic Search)   │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Retrieve Top 5      │
-    │ Relevant Chunks      │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ LLM Generation      │
-    │ (with Context)      │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Return Answer +     │
-    │ Source Citations    │
-    └─────────────────────┘
-    """, language="text")
-    
-    st.markdown("---")
-    
-    # Use Case 2: Intelligent Search
-    st.markdown("### Use Case 2: Intelligent Search")
-    
-    st.markdown("""
-    **Process Flow:**
-    
-    1. User enters search query
-    2. Query is converted to embedding vector
-    3. Similarity search performed in vector database
-    4. Top K most relevant documents retrieved (default: 10)
-    5. Results ranked by relevance score
-    6. Documents displayed with metadata (title, URL, pass type, category)
-    7. User can expand each result to view full content
-    """)
-    
-    st.code("""
-    ┌─────────────┐
-    │ Search Query│
-    └──────┬──────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Convert to          │
-    │ Embedding Vector    │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Similarity Search   │
-    │ in Vector DB        │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Rank by Relevance   │
-    │ Score               │
-    └──────┬──────────────┘
-           │
-           ▼
-    ┌─────────────────────┐
-    │ Return Top K        │
-    │ Results with        │
-    │ Metadata            │
-    └─────────────────────┘
-    """, language="text")
-    
-    st.markdown("---")
-    
-    # Data Flow
-    st.markdown("### Knowledge Base Building Process")
-    
-    st.markdown("""
-    **Data Flow:**
-    
-    1. **Web Scraping**: Scrape official MOM website pages
-    2. **Data Processing**: Clean and structure scraped content
-    3. **Categorization**: Automatically categorize by pass type and content type
-    4. **Chunking**: Split documents into manageable chunks (1000 chars, 200 overlap)
-    5. **Embedding**: Convert chunks to vector embeddings
-    6. **Storage**: Store in ChromaDB vector database
-    7. **Indexing**: Create searchable index for retrieval
-    """)
-    
-    st.code("""
-    ┌─────────────────┐
-    │ MOM Website      │
-    │ (mom.gov.sg)     │
-    └────────┬─────────┘
-             │
-             ▼
-    ┌─────────────────┐
-    │ Web Scraper      │
-    │ (BeautifulSoup) │
-    └────────┬─────────┘
-             │
-             ▼
-    ┌─────────────────┐
-    │ Data Processor   │
-    │ (Clean & Chunk)  │
-    └────────┬─────────┘
-             │
-             ▼
-    ┌─────────────────┐
-    │ Embedding       │
-    │ (OpenAI API)    │
-    └────────┬─────────┘
-             │
-             ▼
-    ┌─────────────────┐
-    │ Vector Database │
-    │ (ChromaDB)      │
-    └─────────────────┘
-    """, language="text")
-    
-    st.markdown("---")
-    
-    # Implementation Details
-    st.markdown("### Implementation Details")
-    
-    st.markdown("""
-    #### Technologies Used
-    
-    - **LangChain**: RAG framework and chain orchestration
-    - **ChromaDB**: Vector database for semantic search
-    - **OpenAI Embeddings**: text-embedding-3-small for document embeddings
-    - **OpenAI GPT-4o-mini**: LLM for answer generation
-    - **Streamlit**: Web application framework
-    
-    #### Key Parameters
-    
-    - **Chunk Size**: 1000 characters
-    - **Chunk Overlap**: 200 characters
-    - **Retrieval Count**: Top 5 chunks per query
-    - **Temperature**: 0.3 (for consistent, factual responses)
-    
-    #### Prompt Engineering
-    
-    The system uses a custom prompt template that:
-    - Instructs the LLM to use only provided context
-    - Encourages citing sources
-    - Handles cases where information is not available
-    - Maintains a helpful, professional tone
-    """)
+    # Flowcharts are inline <pre> blocks so the whole page is a single markdown element
+    st.markdown(page_content.METHODOLOGY_MD, unsafe_allow_html=True)
 
 def main():
     """Main application"""
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
+    
     # Check authentication
     if not check_password():
         return
@@ -0,0 +1,98 @@
+"""
+Process-wide shared clients for embeddings, the LLM and the vector database
+"""
+import functools
+import logging
+from typing import TYPE_CHECKING, Optional
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from embedding_cache import CachedEmbeddings
+import config
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+logger = logging.getLogger(__name__)
+
+@functools.cache
+def get_http_client() -> httpx.Client:
+    """Shared HTTP/2 keep-alive connection pool for OpenAI requests"""
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    )
+
+def new_async_http_client() -> httpx.AsyncClient:
+    """
+    New HTTP/2 keep-alive connection pool for async OpenAI requests
+    
+    Not shared: its connections belong to the event loop that opened them, so the caller owns it
+    and closes it (see RAGEngine.aclose).
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        timeout=30
+    )
+
+@functools.cache
+def get_embeddings() -> CachedEmbeddings:
+    """Shared, cached OpenAI embeddings model"""
+    model = "text-embedding-3-small"
+    return CachedEmbeddings(
+        OpenAIEmbeddings(
+            model=model,
+            dimensions=config.EMBEDDING_DIMENSIONS,
+            openai_api_key=config.OPENAI_API_KEY,
+            http_client=get_http_client()
+        ),
+        maxsize=config.EMBEDDING_CACHE_SIZE,
+        db_path=config.EMBEDDING_CACHE_DB,
+        db_max_rows=config.EMBEDDING_CACHE_DB_MAX_ROWS,
+        namespace=f"{model}:{config.EMBEDDING_DIMENSIONS or 'full'}"
+    )
+
+@functools.cache
+def get_vector_store() -> "Chroma":
+    """Shared handle to the persistent Chroma collection (created if it does not exist)"""
+    # Imported here since chromadb is the slowest import and only needed once the store is opened
+    from langchain_chroma import Chroma
+    
+    vector_store = Chroma(
+        persist_directory=config.VECTOR_DB_PATH,
+        embedding_function=get_embeddings(),
+        collection_name=config.COLLECTION_NAME,
+        collection_metadata=config.CHROMA_COLLECTION_METADATA
+    )
+    if not collection_settings_match(vector_store._collection):
+        logger.warning(
+            f"Collection '{config.COLLECTION_NAME}' was created with HNSW settings "
+            f"{vector_store._collection.metadata} rather than {config.CHROMA_COLLECTION_METADATA}; "
+            "run knowledge_base/builder.py to recreate it"
+        )
+    return vector_store
+
+def collection_settings_match(collection) -> bool:
+    """Whether a Chroma collection was created with the configured HNSW settings (Chroma only applies them at creation)"""
+    metadata = collection.metadata or {}
+    return all(metadata.get(key) == value for key, value in config.CHROMA_COLLECTION_METADATA.items())
+
+def create_llm(http_async_client: Optional[httpx.AsyncClient] = None) -> ChatOpenAI:
+    """
+    Chat model on the shared sync connection pool, so calls reuse warm HTTP/2 connections
+    
+    Args:
+        http_async_client: Optional async client for ainvoke/astream, from new_async_http_client()
+    """
+    return ChatOpenAI(
+        model_name=config.OPENAI_MODEL,
+        temperature=0.3,
+        openai_api_key=config.OPENAI_API_KEY,
+        http_client=get_http_client(),
+        http_async_client=http_async_client
+    )
+
+@functools.cache
+def get_llm() -> ChatOpenAI:
+    """Shared chat model for sync calls"""
+    return create_llm()
@@ -10,13 +10,63 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = "gpt-4o-mini"  # Using mini for cost efficiency, can upgrade to gpt-4 if needed
 
+# Embedding Configuration
+# text-embedding-3 models can return shortened vectors; e.g. 512 cuts Chroma index memory and
+# disk I/O by 3x versus the full 1536 at a small recall cost. None keeps full-size vectors.
+# Changing this requires deleting and rebuilding chroma_db.
+EMBEDDING_DIMENSIONS = None
+
+# Embedding Cache Configuration
+EMBEDDING_CACHE_SIZE = 2048  # Maximum number of cached embedding vectors
+# Query embeddings are also kept on disk (as float16) so repeated questions skip the API after a restart;
+# set to None to cache in memory only
+EMBEDDING_CACHE_DB = "./cache/query_embeddings.sqlite"
+EMBEDDING_CACHE_DB_MAX_ROWS = 50000  # Oldest query embeddings beyond this are deleted (~3 KB each at 1536 dims)
+
+# Knowledge Base Build Configuration
+EMBEDDING_BATCH_SIZE = 100  # Chunks per embedding request
+EMBEDDING_MAX_WORKERS = 8  # Concurrent embedding requests during build
+
 # Vector Database Configuration
 VECTOR_DB_PATH = "./chroma_db"
 COLLECTION_NAME = "singapore_work_passes"
+# HNSW index settings, applied when the collection is first created (builder.py recreates it when they change).
+# search_ef is fixed per collection (Chroma has no per-query ef), so it is sized for the k <= 10 lookups the app makes;
+# a lower value visits fewer graph nodes per query - check recall@5 on sample questions before lowering it further.
+CHROMA_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 16,
+    "hnsw:search_ef": 64
+}
+
+# Retrieval: rerank the RETRIEVAL_FETCH_K nearest chunks with maximal marginal relevance (MMR) so
+# near-duplicate chunks from the same page don't fill the prompt. Lambda 1 = pure relevance, 0 = pure diversity.
+RETRIEVAL_MMR = True
+RETRIEVAL_FETCH_K = 20
+RETRIEVAL_MMR_LAMBDA = 0.5
+
+# Unique pass types and categories, written by the builder so the app never scans collection metadata
+METADATA_SUMMARY_PATH = os.path.join(VECTOR_DB_PATH, "metadata_summary.json")
+
+# Where queries are searched. Chroma is always the persistent store; "memory" and "faiss" load its
+# vectors into RAM at start-up and search there instead of querying Chroma:
+#   "memory" - exact search with one numpy matrix product over float32 vectors: ~6 KB of RAM per chunk
+#              at 1536 dims, a few ms per query at 10k chunks. Best for up to tens of thousands of chunks.
+#   "faiss"  - FAISS HNSW graph (pip install faiss-cpu), for larger knowledge bases; with FAISS_INT8 it
+#              needs ~4x less RAM than "memory" at a small recall cost.
+#   "chroma" - query Chroma directly.
+VECTOR_SEARCH_BACKEND = "memory"
+FAISS_HNSW_M = 32  # HNSW graph degree for the "faiss" backend
+FAISS_INT8 = True  # Store the "faiss" backend's vectors as 8-bit codes - 4x less RAM, <1% cosine error
 
 # MOM Website URLs - Official sources for work pass information
 MOM_BASE_URL = "https://www.mom.gov.sg"
 MOM_PASSES_URL = f"{MOM_BASE_URL}/passes-and-permits"
+# Validators and parsed pages from the last scrape, so unchanged pages are skipped on rebuild
+SCRAPE_CACHE_PATH = "./cache/scrape_cache.json"
+# Each page's processed chunks from the last build, keyed by a hash of the page, so unchanged pages skip processing
+PROCESSED_CACHE_PATH = "./cache/processed_pages.json"
 
 # Work Pass Categories (Reference - used for display/organization, not enforced in categorization)
 # The actual categorization will be flexible based on content analysis
@@ -55,7 +105,31 @@ WORK_PASS_CATEGORIES = {
     }
 }
 
+# User Profile Options (sidebar selectboxes in the chat page)
+NATIONALITY_OPTIONS = ("Select...", "Singaporean", "Malaysian", "Indian", "Chinese", "Filipino", "Indonesian", "Other")
+CURRENT_PASS_OPTIONS = ("None", "Employment Pass", "S Pass", "Work Permit", "Student Pass", "Other")
+SALARY_RANGE_OPTIONS = ("Select...", "Below 3,000", "3,000 - 5,000", "5,000 - 10,000", "10,000 - 15,000", "Above 15,000")
+
+# Number of most recent chat messages rendered on each rerun (older ones are behind a toggle)
+CHAT_HISTORY_DISPLAY_LIMIT = 20
+
 # Chunking Configuration for RAG
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Semantic Answer Cache Configuration
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity to reuse a cached answer
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+SEMANTIC_CACHE_TTL = 3600  # seconds
+SEMANTIC_CACHE_DIR = "./cache"  # Persisted between restarts; set to None to keep the cache in memory only
+SEMANTIC_CACHE_SAVE_EVERY = 50  # Inserts between saves
+
+# Warm-up Configuration
+# Common questions run in the background when the RAG engine loads, so the first
+# users don't pay for cold caches and connections
+WARMUP = True
+WARMUP_QUESTIONS = [
+    f"What are the eligibility requirements for the {pass_name}?"
+    for category in WORK_PASS_CATEGORIES.values()
+    for pass_name in category["passes"]
+]
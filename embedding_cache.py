@@ -0,0 +1,150 @@
+"""
+In-process LRU cache for embedding calls, with an optional on-disk store for query embeddings
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embeddings model so repeated texts are served from memory instead of the API"""
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 2048, ttl_seconds: Optional[float] = None,
+                 db_path: Optional[str] = None, namespace: str = "", db_max_rows: int = 50000):
+        """
+        Initialize the cache
+
+        Args:
+            embeddings: Underlying embeddings model (e.g. OpenAIEmbeddings)
+            maxsize: Maximum number of cached vectors before the least recently used is evicted
+            ttl_seconds: Optional age after which a cached vector is recomputed
+            db_path: Optional SQLite file that keeps query embeddings (as float16) across restarts
+            namespace: Identifies the model and vector size, so a stored vector is never reused for a different model
+            db_max_rows: Maximum number of query embeddings kept on disk; the oldest are deleted beyond it
+        """
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # hash -> (timestamp, vector)
+        self._lock = threading.Lock()
+        self.db_max_rows = db_max_rows
+        self._db = self._open_db(db_path) if db_path else None
+        self._stores_since_prune = 0
+
+    @staticmethod
+    def _open_db(db_path: str) -> Optional[sqlite3.Connection]:
+        """Open (creating if needed) the on-disk query embedding store"""
+        try:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)")
+            db.commit()
+            return db
+        except Exception as e:
+            logger.error(f"Error opening embedding cache database: {str(e)}")
+            return None
+
+    @staticmethod
+    def _key(text: str) -> str:
+        """Hash the normalized text so the cache key is small and case/whitespace insensitive"""
+        return hashlib.sha1(text.strip().lower().encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            timestamp, vector = item
+            if self.ttl_seconds is not None and time.time() - timestamp > self.ttl_seconds:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return vector
+
+    def _put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._cache[key] = (time.time(), vector)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _get_stored(self, key: str) -> Optional[List[float]]:
+        """Look up a query vector in the on-disk store"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created, vector FROM query_embeddings WHERE key = ?", (f"{self.namespace}:{key}",)
+            ).fetchone()
+        if row is None:
+            return None
+        created, blob = row
+        if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+            return None
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+
+    def _store(self, key: str, vector: List[float]):
+        """Save a query vector to the on-disk store at half precision"""
+        blob = np.asarray(vector, dtype=np.float16).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+                (f"{self.namespace}:{key}", time.time(), blob)
+            )
+            # Trim the store back to db_max_rows every so often rather than on every insert
+            self._stores_since_prune += 1
+            if self._stores_since_prune >= 100:
+                self._db.execute(
+                    "DELETE FROM query_embeddings WHERE created < "
+                    "(SELECT created FROM query_embeddings ORDER BY created DESC LIMIT 1 OFFSET ?)",
+                    (self.db_max_rows - 1,)
+                )
+                self._stores_since_prune = 0
+            self._db.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the cached vector if the same text was seen before"""
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None and self._db is not None:
+            vector = self._get_stored(key)
+            if vector is not None:
+                self._put(key, vector)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._put(key, vector)
+            if self._db is not None:
+                self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, sending only texts that are not already cached to the API"""
+        keys = [self._key(text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text, key, vector in zip(texts, keys, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            for key, vector in computed.items():
+                self._put(key, vector)
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+
+        return vectors
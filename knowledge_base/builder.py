@@ -1,22 +1,24 @@
 """
 Build and populate the vector database with processed knowledge base
 """
+import asyncio
 import os
 import sys
+import time
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from knowledge_base.scraper import MOMScraper
-from knowledge_base.processor import DataProcessor
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+from knowledge_base.processor import ChunkMeta, DataProcessor, compute_content_hash, summarize_metadata
 from langchain_core.documents import Document
-from typing import List, Dict
+from typing import List
+from clients import collection_settings_match, get_embeddings, get_vector_store
 import config
 import logging
-import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,10 +27,7 @@ class KnowledgeBaseBuilder:
     """Build the knowledge base from MOM website data"""
     
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            openai_api_key=config.OPENAI_API_KEY
-        )
+        self.embeddings = get_embeddings()
         self.vector_store = None
         
     def build_from_scraping(self, max_pages: int = 50, save_raw: bool = True):
@@ -37,8 +36,8 @@ class KnowledgeBaseBuilder:
         
         # Step 1: Scrape MOM website
         logger.info("Step 1: Scraping MOM website...")
-        scraper = MOMScraper(config.MOM_BASE_URL)
-        scraped_data = scraper.scrape_all(max_pages=max_pages)
+        scraper = MOMScraper(config.MOM_BASE_URL, cache_path=config.SCRAPE_CACHE_PATH)
+        scraped_data = asyncio.run(scraper.scrape_all_async(max_pages=max_pages))
         
         if save_raw:
             scraper.save_to_json("mom_data.json")
@@ -52,7 +51,8 @@ class KnowledgeBaseBuilder:
         logger.info("Step 2: Processing scraped data...")
         processor = DataProcessor(
             chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP
+            chunk_overlap=config.CHUNK_OVERLAP,
+            cache_path=config.PROCESSED_CACHE_PATH
         )
         # Process with flexible categorization (categories parameter is optional)
         processed_chunks = processor.process_scraped_data(
@@ -85,53 +85,79 @@ class KnowledgeBaseBuilder:
     
     def create_vector_db(self, processed_chunks: List[dict]):
         """Create and populate ChromaDB vector database"""
-        import time
-        
-        # Convert to LangChain Documents and clean metadata
-        documents = []
+        # Convert to LangChain Documents, keeping one document per distinct chunk text.
+        # ChunkMeta fixes the metadata schema, so malformed chunks fail here rather than in Chroma
+        documents = {}
         for chunk in processed_chunks:
-            # Clean metadata - convert complex types to strings
-            metadata = chunk['metadata'].copy()
-            
-            # Convert headings list to string if it exists
-            if 'headings' in metadata and isinstance(metadata['headings'], list):
-                # Convert list of dicts to a readable string
-                headings_str = "; ".join([f"{h.get('level', '')}: {h.get('text', '')}" for h in metadata['headings']])
-                metadata['headings'] = headings_str
-            
-            # Filter out any remaining complex metadata types
-            cleaned_metadata = {}
-            for key, value in metadata.items():
-                if isinstance(value, (str, int, float, bool)) or value is None:
-                    cleaned_metadata[key] = value
-                elif isinstance(value, list):
-                    # Convert lists to string
-                    cleaned_metadata[key] = json.dumps(value) if value else ""
-                elif isinstance(value, dict):
-                    # Convert dicts to string
-                    cleaned_metadata[key] = json.dumps(value)
-                # Skip other complex types
-            
-            doc = Document(
-                page_content=chunk['text'],
-                metadata=cleaned_metadata
-            )
-            documents.append(doc)
-        
-        # Create vector store with retry logic for rate limits
+            meta = ChunkMeta.from_dict(chunk['metadata'])
+            meta.content_hash = compute_content_hash(chunk['text'])
+            documents.setdefault(meta.content_hash, Document(page_content=chunk['text'], metadata=meta.to_dict()))
+        
+        self.vector_store = get_vector_store()
+        # HNSW settings (distance metric, ef, M) only apply when a collection is created, so a
+        # collection created with other settings is dropped and every chunk re-embedded into a new one
+        if not collection_settings_match(self.vector_store._collection):
+            logger.info("Collection HNSW settings differ from config - recreating the collection")
+            self.vector_store.delete_collection()
+            get_vector_store.cache_clear()
+            self.vector_store = get_vector_store()
+        collection = self.vector_store._collection
+        
+        # Chunks are stored under their content hash, so anything already in the
+        # collection is unchanged and only new chunks need embedding
+        existing_ids = set(collection.get(include=[])['ids'])
+        stale_ids = list(existing_ids - documents.keys())
+        # Chroma rejects single calls larger than its max batch size
+        # (older chromadb releases expose it as a property rather than a method)
+        client = self.vector_store._client
+        get_max_batch_size = getattr(client, "get_max_batch_size", None)
+        max_batch_size = get_max_batch_size() if get_max_batch_size else client.max_batch_size
+        if stale_ids:
+            for i in range(0, len(stale_ids), max_batch_size):
+                collection.delete(ids=stale_ids[i:i + max_batch_size])
+            logger.info(f"Removed {len(stale_ids)} chunks no longer in the knowledge base")
+        
+        new_ids = [content_hash for content_hash in documents if content_hash not in existing_ids]
+        unchanged_ids = [content_hash for content_hash in documents if content_hash in existing_ids]
+        logger.info(f"{len(unchanged_ids)} chunks unchanged, {len(new_ids)} chunks to embed")
+        
+        # Metadata (e.g. category) may change without the text changing - refresh it without re-embedding
+        for i in range(0, len(unchanged_ids), max_batch_size):
+            batch_ids = unchanged_ids[i:i + max_batch_size]
+            collection.update(ids=batch_ids, metadatas=[documents[doc_id].metadata for doc_id in batch_ids])
+        
+        # Embed in parallel batches, then upsert the precomputed vectors so Chroma
+        # does not re-embed the documents
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        id_batches = [new_ids[i:i + batch_size] for i in range(0, len(new_ids), batch_size)]
+        text_batches = [[documents[doc_id].page_content for doc_id in ids] for ids in id_batches]
+        
+        with ThreadPoolExecutor(max_workers=config.EMBEDDING_MAX_WORKERS) as executor:
+            # map() yields results in batch order, so vectors line up with id_batches
+            for i, vectors in enumerate(executor.map(self._embed_batch, text_batches)):
+                collection.upsert(
+                    ids=id_batches[i],
+                    embeddings=vectors,
+                    documents=text_batches[i],
+                    metadatas=[documents[doc_id].metadata for doc_id in id_batches[i]]
+                )
+                logger.info(f"Added batch {i + 1}/{len(id_batches)} to vector database")
+        
+        # Save the pass types and categories alongside the collection for the app's filters
+        summary = summarize_metadata(document.metadata for document in documents.values())
+        Path(config.METADATA_SUMMARY_PATH).write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+        
+        logger.info(f"Vector database contains {len(documents)} documents")
+        logger.info(f"Vector DB saved to: {config.VECTOR_DB_PATH}")
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts, retrying with exponential backoff on rate limits"""
         max_retries = 3
         retry_delay = 5  # seconds
         
         for attempt in range(max_retries):
             try:
-                logger.info(f"Creating vector database (attempt {attempt + 1}/{max_retries})...")
-                self.vector_store = Chroma.from_documents(
-                    documents=documents,
-                    embedding=self.embeddings,
-                    persist_directory=config.VECTOR_DB_PATH,
-                    collection_name=config.COLLECTION_NAME
-                )
-                break
+                return self.embeddings.embed_documents(texts)
             except Exception as e:
                 if "429" in str(e) or "rate" in str(e).lower() or "quota" in str(e).lower():
                     if attempt < max_retries - 1:
@@ -142,9 +168,6 @@ class KnowledgeBaseBuilder:
                         raise Exception(f"Failed after {max_retries} attempts due to rate limits. Please check your OpenAI API quota.")
                 else:
                     raise
-        
-        logger.info(f"Created vector database with {len(documents)} documents")
-        logger.info(f"Vector DB saved to: {config.VECTOR_DB_PATH}")
     
     def load_vector_db(self):
         """Load existing vector database"""
@@ -152,11 +175,7 @@ class KnowledgeBaseBuilder:
             logger.error(f"Vector database not found at {config.VECTOR_DB_PATH}")
             return None
         
-        self.vector_store = Chroma(
-            persist_directory=config.VECTOR_DB_PATH,
-            embedding_function=self.embeddings,
-            collection_name=config.COLLECTION_NAME
-        )
+        self.vector_store = get_vector_store()
         
         logger.info("Vector database loaded successfully")
         return self.vector_store
@@ -1,19 +1,168 @@
 """
 Process and structure scraped MOM data into categorized knowledge base
 """
-import json
 import re
-from typing import List, Dict
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Dict, Optional, Union
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+import orjson
+import ahocorasick
+from blake3 import blake3
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def compute_content_hash(text: str) -> str:
+    """Fingerprint chunk text so unchanged chunks can be recognised across rebuilds"""
+    return blake3(text.encode('utf-8')).hexdigest()
+
+# Bump when cleaning, classification or chunking changes, so cached page chunks are rebuilt
+PAGE_CACHE_VERSION = 1
+
+# Keywords used to detect the pass type a page is about, for categorization
+PASS_TYPE_KEYWORDS = {
+    "employment_pass": ["employment pass", "ep", "employmentpass"],
+    "pep": ["personalised employment pass", "pep", "personalized employment pass"],
+    "entrepass": ["entrepass", "entrepreneur pass"],
+    "s_pass": ["s pass", "s-pass", "spass"],
+    "work_permit": ["work permit", "workpermit"],
+    "fdw": ["foreign domestic worker", "fdw", "domestic worker", "domestic helper"],
+    "performing_artiste": ["performing artiste", "performing artist"],
+    "confinement_nanny": ["confinement nanny", "confinement"],
+    "training_pass": ["training employment pass", "training pass"],
+    "work_holiday": ["work holiday pass", "work holiday"],
+    "dependant": ["dependant", "dependent", "dependant pass"],
+    "ltvp": ["ltvp", "long-term visit pass", "long term visit pass"]
+}
+
+# Broader category for each detected pass type; pass types not listed are their own category
+PASS_TYPE_GROUPS = {
+    "employment_pass": "employment_passes",
+    "pep": "employment_passes",
+    "entrepass": "employment_passes",
+    "s_pass": "work_permits",
+    "work_permit": "work_permits",
+    "fdw": "sector_specific",
+    "performing_artiste": "sector_specific",
+    "confinement_nanny": "sector_specific",
+    "training_pass": "other_passes",
+    "work_holiday": "other_passes",
+    "dependant": "other_passes",
+    "ltvp": "other_passes"
+}
+
+# Fallback categories by content type, checked in order when no pass type is detected
+CONTENT_TYPE_KEYWORDS = (
+    ("eligibility_requirements", ("eligibility", "requirements")),
+    ("application_process", ("application", "apply")),
+    ("renewal", ("renew", "renewal")),
+    ("fees", ("fee", "cost", "price"))
+)
+
+# Common pass type patterns, matched against a page's URL and title
+PASS_TYPES = {
+    "Employment Pass": ["employment pass", "ep"],
+    "Personalised Employment Pass": ["pep", "personalised employment pass"],
+    "EntrePass": ["entrepass"],
+    "S Pass": ["s pass", "s-pass"],
+    "Work Permit": ["work permit"],
+    "Foreign Domestic Worker": ["fdw", "foreign domestic worker", "domestic worker"],
+    "Performing Artiste": ["performing artiste"],
+    "Confinement Nanny": ["confinement nanny"],
+    "Training Employment Pass": ["training employment pass"],
+    "Work Holiday Pass": ["work holiday pass"],
+    "Dependant's Pass": ["dependant", "dependent"],
+    "Long-Term Visit Pass": ["ltvp", "long-term visit pass"]
+}
+
+# Special characters other than basic punctuation, or a run of whitespace - both become a single space
+CLEAN_TEXT_RE = re.compile(r'[^\w\s\.\,\!\?\:\;\(\)\-\']|\s+')
+
+def _build_automaton(keyword_table: Dict[str, List[str]]) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton whose values are the (label, keyword) pairs for each keyword"""
+    labels_by_keyword = {}
+    for label, keywords in keyword_table.items():
+        for keyword in keywords:
+            labels_by_keyword.setdefault(keyword, []).append((label, keyword))
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, labels in labels_by_keyword.items():
+        automaton.add_word(keyword, labels)
+    automaton.make_automaton()
+    return automaton
+
+def format_headings(headings: Union[Dict[str, List[str]], List[Dict]]) -> str:
+    """
+    Flatten scraped headings into a readable string (Chroma metadata must be scalar)
+    
+    Args:
+        headings: {'levels': [...], 'texts': [...]} as scraped, or a list of
+            {'level', 'text'} dicts as saved by older versions of the scraper
+    """
+    if isinstance(headings, dict):
+        return "; ".join(f"{level}: {text}" for level, text in zip(headings['levels'], headings['texts']))
+    return "; ".join(f"{h.get('level', '')}: {h.get('text', '')}" for h in headings)
+
+def summarize_metadata(metadatas: Iterable[Dict]) -> Dict[str, List[str]]:
+    """
+    Collect the unique pass types and categories across chunk metadata
+    
+    Args:
+        metadatas: Chunk metadata dicts
+    
+    Returns:
+        {'pass_types': [...], 'categories': [...]}, each sorted; "General" is not a pass type
+    """
+    pass_types = set()
+    categories = set()
+    for metadata in metadatas:
+        pass_type = metadata.get("pass_type", "General")
+        if pass_type and pass_type != "General":
+            pass_types.add(pass_type)
+        category = metadata.get("category", "general")
+        if category:
+            categories.add(category)
+    return {"pass_types": sorted(pass_types), "categories": sorted(categories)}
+
+@dataclass(slots=True)
+class ChunkMeta:
+    """Metadata stored with each knowledge base chunk"""
+    source: str
+    title: str
+    category: str
+    pass_type: str
+    chunk_index: int
+    total_chunks: int
+    headings: str = ""
+    content_hash: str = ""
+    
+    @classmethod
+    def from_dict(cls, metadata: Dict) -> "ChunkMeta":
+        """Build from a chunk's metadata dict, flattening headings saved unflattened by older versions"""
+        if isinstance(metadata.get('headings'), (list, dict)):
+            metadata = {**metadata, 'headings': format_headings(metadata['headings'])}
+        return cls(**metadata)
+    
+    def to_dict(self) -> Dict:
+        """Flat dict for Chroma - all fields are scalars, so this skips dataclasses.asdict's recursive deep copy"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
 class DataProcessor:
     """Process scraped data into structured knowledge base chunks"""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, cache_path: Optional[str] = None):
+        """
+        Initialize the processor
+        
+        Args:
+            chunk_size: Maximum characters per chunk
+            chunk_overlap: Characters shared between consecutive chunks
+            cache_path: Optional JSON file of each page's chunks from previous runs, so unchanged
+                pages skip cleaning, classification and chunking
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -21,149 +170,218 @@ class DataProcessor:
             chunk_overlap=chunk_overlap,
             length_function=len,
         )
+        # Keyword automatons - each scans text once for all keywords instead of one `in` per keyword
+        self._category_automaton = _build_automaton(PASS_TYPE_KEYWORDS)
+        self._pass_type_automaton = _build_automaton(PASS_TYPES)
+        # Page cache key -> that page's processed chunks
+        self.cache_path = Path(cache_path) if cache_path else None
+        self._page_cache = self._load_page_cache()
     
     def categorize_content(self, content: Dict, categories: Dict = None) -> str:
         """Categorize content based on keywords and URL patterns - flexible categorization"""
-        url_lower = content['url'].lower()
-        text_lower = content['content'].lower()
-        title_lower = content['title'].lower()
-        combined_text = f"{url_lower} {text_lower} {title_lower}"
-        
-        # Extract pass type from content - flexible keyword detection
-        pass_type_keywords = {
-            "employment_pass": ["employment pass", "ep", "employmentpass"],
-            "pep": ["personalised employment pass", "pep", "personalized employment pass"],
-            "entrepass": ["entrepass", "entrepreneur pass"],
-            "s_pass": ["s pass", "s-pass", "spass"],
-            "work_permit": ["work permit", "workpermit"],
-            "fdw": ["foreign domestic worker", "fdw", "domestic worker", "domestic helper"],
-            "performing_artiste": ["performing artiste", "performing artist"],
-            "confinement_nanny": ["confinement nanny", "confinement"],
-            "training_pass": ["training employment pass", "training pass"],
-            "work_holiday": ["work holiday pass", "work holiday"],
-            "dependant": ["dependant", "dependent", "dependant pass"],
-            "ltvp": ["ltvp", "long-term visit pass", "long term visit pass"]
+        combined_text = f"{content['url']} {content['content']} {content['title']}".lower()
+        return self._categorize_lowered(combined_text)
+    
+    def _categorize_lowered(self, combined_text: str) -> str:
+        """Categorize already-lowercased "url content title" text"""
+        # Find the most relevant pass type - one automaton pass finds every keyword,
+        # and each pass type scores one point per distinct keyword present
+        matched = set()
+        for _, matches in self._category_automaton.iter(combined_text):
+            matched.update(matches)
+        keyword_counts = Counter(pass_type for pass_type, _ in matched)
+        pass_type_scores = {
+            pass_type: keyword_counts[pass_type]
+            for pass_type in PASS_TYPE_KEYWORDS if keyword_counts[pass_type]
         }
         
-        # Find the most relevant pass type
-        pass_type_scores = {}
-        for pass_type, keywords in pass_type_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in combined_text)
-            if score > 0:
-                pass_type_scores[pass_type] = score
-        
         # Determine category based on pass type or content structure
         if pass_type_scores:
             # Get the pass type with highest score
             detected_pass = max(pass_type_scores, key=pass_type_scores.get)
             
             # Group into broader categories for organization (but keep flexibility)
-            if detected_pass in ["employment_pass", "pep", "entrepass"]:
-                return "employment_passes"
-            elif detected_pass in ["s_pass", "work_permit"]:
-                return "work_permits"
-            elif detected_pass in ["fdw", "performing_artiste", "confinement_nanny"]:
-                return "sector_specific"
-            elif detected_pass in ["training_pass", "work_holiday", "dependant", "ltvp"]:
-                return "other_passes"
-            else:
-                return detected_pass
+            return PASS_TYPE_GROUPS.get(detected_pass, detected_pass)
         
         # If no specific pass type detected, categorize by content type
-        if "eligibility" in combined_text or "requirements" in combined_text:
-            return "eligibility_requirements"
-        elif "application" in combined_text or "apply" in combined_text:
-            return "application_process"
-        elif "renew" in combined_text or "renewal" in combined_text:
-            return "renewal"
-        elif "fee" in combined_text or "cost" in combined_text or "price" in combined_text:
-            return "fees"
-        else:
-            return "general"
+        for category, keywords in CONTENT_TYPE_KEYWORDS:
+            if any(keyword in combined_text for keyword in keywords):
+                return category
+        return "general"
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize text content"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.\,\!\?\:\;\(\)\-\']', ' ', text)
-        # Remove multiple newlines
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        # Replace special characters (keeping punctuation) and collapse whitespace in one pass
+        text = CLEAN_TEXT_RE.sub(' ', text)
         return text.strip()
     
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split cleaned text into overlapping chunks
+        
+        Cleaned text is a single line of space-separated words, so the recursive splitter always ends
+        up splitting on spaces. This does the same greedy packing directly over word offsets in one
+        linear pass and produces identical chunks. Anything else (newlines, no spaces, a word too long
+        for a chunk) goes through the recursive splitter.
+        
+        Args:
+            text: Text returned by clean_text
+        
+        Returns:
+            List of chunk strings
+        """
+        if '\n' in text or ' ' not in text:
+            return self.text_splitter.split_text(text)
+        
+        # Piece i runs from starts[i] to starts[i + 1] - a word plus the space in front of it
+        words = text.split(' ')
+        lengths = [len(words[0])] + [len(word) + 1 for word in words[1:]]
+        if max(lengths) >= self.chunk_size:
+            return self.text_splitter.split_text(text)
+        
+        starts = [0] * (len(lengths) + 1)
+        for i, length in enumerate(lengths):
+            starts[i + 1] = starts[i] + length
+        
+        chunks = []
+        first = 0  # first piece in the current window
+        total = 0  # characters in the current window
+        for i, length in enumerate(lengths):
+            if length and total + length > self.chunk_size:
+                if i > first:
+                    chunk = text[starts[first]:starts[i]].strip()
+                    if chunk:
+                        chunks.append(chunk)
+                    # Drop pieces from the front until what's left fits the overlap and the next piece
+                    while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                        total -= lengths[first]
+                        first += 1
+            if length:
+                total += length
+            elif i == first:
+                # Empty leading piece - the recursive splitter discards these
+                first += 1
+        
+        chunk = text[starts[first]:].strip()
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    def _page_cache_key(self, page_data: Dict, headings: str) -> str:
+        """Hash of everything that determines a page's chunks"""
+        return compute_content_hash(orjson.dumps([
+            PAGE_CACHE_VERSION, self.chunk_size, self.chunk_overlap,
+            page_data['url'], page_data['title'], page_data['content'], headings
+        ]).decode())
+    
+    def _load_page_cache(self) -> Dict[str, List[Dict]]:
+        """Load page chunks saved by a previous run"""
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+        try:
+            return orjson.loads(self.cache_path.read_bytes())
+        except Exception as e:
+            logger.error(f"Error loading processed page cache: {str(e)}")
+            return {}
+    
+    def _save_page_cache(self):
+        """Write page chunks so the next run can skip unchanged pages"""
+        if not self.cache_path:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_path.write_bytes(orjson.dumps(self._page_cache))
+        except Exception as e:
+            logger.error(f"Error saving processed page cache: {str(e)}")
+    
+    def _process_page(self, page_data: Dict, headings: str) -> List[Dict]:
+        """Clean, classify and chunk a single scraped page"""
+        page_chunks = []
+        
+        # Clean content
+        cleaned_content = self.clean_text(page_data['content'])
+        
+        # Categorize (flexible - doesn't require predefined categories) and extract pass type,
+        # lowercasing each field once for both scans
+        url_lower = page_data['url'].lower()
+        title_lower = page_data['title'].lower()
+        category = self._categorize_lowered(f"{url_lower} {page_data['content'].lower()} {title_lower}")
+        pass_type = self._pass_type_lowered(f"{url_lower} {title_lower}")
+        
+        # Split into chunks
+        chunks = self.split_text(cleaned_content)
+        
+        # Create metadata for each chunk
+        for i, chunk in enumerate(chunks):
+            chunk_metadata = {
+                'source': page_data['url'],
+                'title': page_data['title'],
+                'category': category,
+                'pass_type': pass_type,
+                'chunk_index': i,
+                'total_chunks': len(chunks),
+                'headings': headings
+            }
+        
+            page_chunks.append({
+                'text': chunk,
+                'metadata': chunk_metadata
+            })
+        
+        return page_chunks
+    
     def process_scraped_data(self, scraped_data: List[Dict], categories: Dict = None) -> List[Dict]:
         """Process scraped data into structured chunks with flexible categorization"""
         processed_chunks = []
+        page_cache = {}
+        reused = 0
         
         for page_data in scraped_data:
-            # Clean content
-            cleaned_content = self.clean_text(page_data['content'])
-            
-            # Categorize (flexible - doesn't require predefined categories)
-            category = self.categorize_content(page_data, categories)
-            
-            # Extract pass type from title/URL if available
-            pass_type = self._extract_pass_type(page_data)
-            
-            # Split into chunks
-            chunks = self.text_splitter.split_text(cleaned_content)
+            # Flatten headings once per page rather than per chunk
+            headings = format_headings(page_data.get('headings', []))
             
-            # Create metadata for each chunk
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    'source': page_data['url'],
-                    'title': page_data['title'],
-                    'category': category,
-                    'pass_type': pass_type,
-                    'chunk_index': i,
-                    'total_chunks': len(chunks),
-                    'headings': page_data.get('headings', [])
-                }
-                
-                processed_chunks.append({
-                    'text': chunk,
-                    'metadata': chunk_metadata
-                })
+            # A page identical to one processed in an earlier run gets its chunks straight from the cache
+            key = self._page_cache_key(page_data, headings)
+            chunks = self._page_cache.get(key)
+            if chunks is None:
+                chunks = self._process_page(page_data, headings)
+            else:
+                reused += 1
+            page_cache[key] = chunks
+            processed_chunks.extend(chunks)
+        
+        # Keep only pages from this run, so the cache doesn't grow with pages that no longer exist
+        self._page_cache = page_cache
+        self._save_page_cache()
+        if reused:
+            logger.info(f"Reused cached chunks for {reused} unchanged pages")
         
         logger.info(f"Processed {len(scraped_data)} pages into {len(processed_chunks)} chunks")
         return processed_chunks
     
-    def _extract_pass_type(self, page_data: Dict) -> str:
-        """Extract specific pass type from page data"""
-        url_lower = page_data['url'].lower()
-        title_lower = page_data['title'].lower()
-        combined = f"{url_lower} {title_lower}"
-        
-        # Common pass type patterns
-        pass_types = {
-            "Employment Pass": ["employment pass", "ep"],
-            "Personalised Employment Pass": ["pep", "personalised employment pass"],
-            "EntrePass": ["entrepass"],
-            "S Pass": ["s pass", "s-pass"],
-            "Work Permit": ["work permit"],
-            "Foreign Domestic Worker": ["fdw", "foreign domestic worker", "domestic worker"],
-            "Performing Artiste": ["performing artiste"],
-            "Confinement Nanny": ["confinement nanny"],
-            "Training Employment Pass": ["training employment pass"],
-            "Work Holiday Pass": ["work holiday pass"],
-            "Dependant's Pass": ["dependant", "dependent"],
-            "Long-Term Visit Pass": ["ltvp", "long-term visit pass"]
-        }
-        
-        for pass_name, keywords in pass_types.items():
-            if any(keyword in combined for keyword in keywords):
+    def _pass_type_lowered(self, url_title: str) -> str:
+        """Extract the pass type from already-lowercased "url title" text"""
+        # Return the first pass type (in PASS_TYPES order) with any keyword present
+        found = {pass_name for _, matches in self._pass_type_automaton.iter(url_title) for pass_name, _ in matches}
+        for pass_name in PASS_TYPES:
+            if pass_name in found:
                 return pass_name
         
         return "General"
     
     def load_from_json(self, filename: str) -> List[Dict]:
         """Load scraped data from JSON file"""
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return orjson.loads(Path(filename).read_bytes())
     
     def save_processed_data(self, processed_chunks: List[Dict], filename: str = "processed_knowledge_base.json"):
         """Save processed chunks to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(processed_chunks, f, indent=2, ensure_ascii=False)
+        # Write one chunk at a time so only a single chunk's JSON is held in memory;
+        # re-indenting each chunk keeps the file identical to dumping the whole list
+        with open(filename, 'wb') as f:
+            f.write(b"[")
+            for i, chunk in enumerate(processed_chunks):
+                f.write(b",\n  " if i else b"\n  ")
+                f.write(orjson.dumps(chunk, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  "))
+            f.write(b"\n]" if processed_chunks else b"]")
         logger.info(f"Saved {len(processed_chunks)} processed chunks to {filename}")
 
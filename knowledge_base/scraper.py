@@ -1,107 +1,232 @@
 """
 Web scraper to collect work pass information from MOM website
 """
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import re
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+import lxml.html
 import time
-import json
-from typing import List, Dict
+import orjson
+from pathlib import Path
+from typing import List, Dict, Optional
 from urllib.parse import urljoin, urlparse
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# lxml refuses str input that still carries an encoding declaration (e.g. XHTML pages)
+XML_DECLARATION_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+# Candidate containers for a page's main content, most specific first
+# (XPath versions of 'main', 'article', '.content', '.main-content', '#main-content', '.page-content')
+CONTENT_XPATHS = [
+    '//main',
+    '//article',
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' main-content ')]",
+    "//*[@id='main-content']",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' page-content ')]"
+]
+
+class HostRateLimiter:
+    """Space out requests to each host so concurrent fetches stay within a polite request rate"""
+    
+    def __init__(self, requests_per_second: float = 1.0):
+        self.interval = 1.0 / requests_per_second
+        self._next_slot: Dict[str, float] = {}
+    
+    async def wait(self, url: str):
+        """Reserve the next free slot for the url's host and sleep until it arrives"""
+        loop = asyncio.get_running_loop()
+        host = urlparse(url).netloc
+        now = loop.time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
 class MOMScraper:
     """Scraper for Ministry of Manpower Singapore website"""
     
-    def __init__(self, base_url: str = "https://www.mom.gov.sg"):
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept-Encoding': 'gzip, deflate'
+    }
+    
+    def __init__(self, base_url: str = "https://www.mom.gov.sg", cache_path: Optional[str] = None):
+        """
+        Initialize the scraper
+        
+        Args:
+            base_url: Site to scrape; links to other hosts are ignored
+            cache_path: Optional JSON file of validators and parsed pages from previous runs, so pages
+                the server reports as unchanged (304) are neither downloaded nor parsed again
+        """
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.base_netloc = urlparse(base_url).netloc
+        # Persistent HTTP/2 connection pool, reused across the sync fetches
+        self.session = httpx.Client(
+            http2=True,
+            headers=self.HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=10)
+        )
         self.scraped_data = []
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.page_cache = self._load_page_cache()
+    
+    def _load_page_cache(self) -> Dict[str, Dict]:
+        """Load {url: {etag, last_modified, page}} saved by a previous run"""
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+        try:
+            return orjson.loads(self.cache_path.read_bytes())
+        except Exception as e:
+            logger.error(f"Error loading page cache: {str(e)}")
+            return {}
+    
+    def save_page_cache(self):
+        """Write the page cache so the next run can make conditional requests"""
+        if not self.cache_path:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_path.write_bytes(orjson.dumps(self.page_cache))
+        except Exception as e:
+            logger.error(f"Error saving page cache: {str(e)}")
+    
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        """Validators from the cached copy of a page, so the server can answer 304 Not Modified"""
+        cached = self.page_cache.get(url)
+        if not cached:
+            return {}
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+    
+    def _remember_page(self, url: str, response: httpx.Response, page: Dict):
+        """Cache a parsed page with its validators, if the server sent any"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.page_cache[url] = {'etag': etag, 'last_modified': last_modified, 'page': page}
         
     def scrape_page(self, url: str) -> Dict:
         """Scrape a single page and extract relevant content"""
         try:
             logger.info(f"Scraping: {url}")
-            response = self.session.get(url, timeout=10)
+            response = self.session.get(url, headers=self._conditional_headers(url))
+            if response.status_code == 304:
+                return self.page_cache[url]['page']
             response.raise_for_status()
+            page = self._parse_page(url, response.content)
+            self._remember_page(url, response, page)
+            return page
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract main content
-            # MOM website typically has content in main, article, or specific divs
-            content_selectors = [
-                'main',
-                'article',
-                '.content',
-                '.main-content',
-                '#main-content',
-                '.page-content'
-            ]
-            
-            content = None
-            for selector in content_selectors:
-                content = soup.select_one(selector)
-                if content:
-                    break
-            
-            if not content:
-                content = soup.find('body')
-            
-            # Remove script and style elements
-            for script in content.find_all(['script', 'style', 'nav', 'footer', 'header']):
-                script.decompose()
-            
-            # Extract text
-            text = content.get_text(separator='\n', strip=True)
-            
-            # Extract title
-            title = soup.find('title')
-            title_text = title.get_text(strip=True) if title else url
-            
-            # Extract headings for structure
-            headings = []
-            for heading in content.find_all(['h1', 'h2', 'h3', 'h4']):
-                headings.append({
-                    'level': heading.name,
-                    'text': heading.get_text(strip=True)
-                })
-            
-            # Extract links for further scraping
-            links = []
-            for link in content.find_all('a', href=True):
-                href = link['href']
-                full_url = urljoin(url, href)
-                if urlparse(full_url).netloc == urlparse(self.base_url).netloc:
-                    links.append(full_url)
-            
-            return {
-                'url': url,
-                'title': title_text,
-                'content': text,
-                'headings': headings,
-                'links': list(set(links))  # Remove duplicates
-            }
-            
         except Exception as e:
             logger.error(f"Error scraping {url}: {str(e)}")
             return None
     
+    async def _scrape_page_async(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                                 rate_limiter: HostRateLimiter, url: str) -> Dict:
+        """Fetch a page without blocking the event loop, then parse it in a worker thread"""
+        async with semaphore:
+            try:
+                # Be respectful - wait for this host's next request slot
+                await rate_limiter.wait(url)
+                logger.info(f"Scraping: {url}")
+                response = await client.get(url, headers=self._conditional_headers(url))
+                if response.status_code == 304:
+                    return self.page_cache[url]['page']
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error scraping {url}: {str(e)}")
+                return None
+        
+        try:
+            page = await asyncio.to_thread(self._parse_page, url, response.content)
+            self._remember_page(url, response, page)
+            return page
+        except Exception as e:
+            logger.error(f"Error scraping {url}: {str(e)}")
+            return None
+    
+    def _parse_page(self, url: str, html: bytes) -> Dict:
+        """Extract relevant content from a fetched page"""
+        # Decode the way BeautifulSoup would (declared or detected charset), then build an lxml tree so
+        # text extraction runs in C rather than walking the tree in Python
+        markup = XML_DECLARATION_RE.sub('', UnicodeDammit(html, is_html=True).unicode_markup, count=1)
+        root = lxml.html.document_fromstring(markup)
+        
+        # Extract main content
+        # MOM website typically has content in main, article, or specific divs
+        content = None
+        for selector in CONTENT_XPATHS:
+            matches = root.xpath(selector)
+            if matches:
+                content = matches[0]
+                break
+        
+        if content is None:
+            content = root.find('body')
+        
+        # Remove script and style elements. Emptied rather than dropped, so the text that follows
+        # each one stays a separate text node instead of being joined onto the text before it
+        for element in list(content.iter('script', 'style', 'nav', 'footer', 'header')):
+            element.clear(keep_tail=True)
+        
+        # Extract text - every non-blank text node, stripped, one per line
+        text = '\n'.join(filter(None, (piece.strip() for piece in content.itertext())))
+        
+        # Extract title
+        title = root.find('.//title')
+        title_text = ''.join(piece.strip() for piece in title.itertext()) if title is not None else url
+        
+        # Extract headings for structure, as parallel lists rather than a dict per heading
+        levels = []
+        texts = []
+        for heading in content.iter('h1', 'h2', 'h3', 'h4'):
+            levels.append(heading.tag)
+            texts.append(''.join(piece.strip() for piece in heading.itertext()))
+        headings = {'levels': levels, 'texts': texts}
+        
+        # Extract links for further scraping
+        # (a dict keeps first-seen order while dropping duplicates)
+        links = {}
+        for link in content.iter('a'):
+            href = link.get('href')
+            if href is None:
+                continue
+            full_url = urljoin(url, href)
+            if urlparse(full_url).netloc == self.base_netloc:
+                links[full_url] = None
+        
+        return {
+            'url': url,
+            'title': title_text,
+            'content': text,
+            'headings': headings,
+            'links': list(links)
+        }
+    
     def find_work_pass_pages(self) -> List[str]:
         """Find all relevant work pass pages from MOM website"""
         # Main passes page
         passes_url = f"{self.base_url}/passes-and-permits"
         
         work_pass_urls = [passes_url]
+        seen_urls = {passes_url}
         
         try:
-            response = self.session.get(passes_url, timeout=10)
+            response = self.session.get(passes_url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Only links are needed here, so skip building the rest of the tree
+            soup = BeautifulSoup(response.content, 'lxml', parse_only=SoupStrainer('a', href=True))
             
             # Find links related to work passes
             # Common patterns in MOM URLs
@@ -126,7 +251,8 @@ class MOMScraper:
                 
                 # Check if URL contains work pass keywords
                 if any(keyword in href.lower() for keyword in pass_keywords):
-                    if full_url not in work_pass_urls:
+                    if full_url not in seen_urls:
+                        seen_urls.add(full_url)
                         work_pass_urls.append(full_url)
             
             logger.info(f"Found {len(work_pass_urls)} work pass related URLs")
@@ -158,13 +284,33 @@ class MOMScraper:
             # Be respectful - add delay between requests
             time.sleep(1)
         
+        self.save_page_cache()
         self.scraped_data = scraped
         return scraped
     
+    async def scrape_all_async(self, max_pages: int = 50, concurrency: int = 8,
+                               requests_per_second: float = 1.0) -> List[Dict]:
+        """Scrape all work pass related pages, fetching up to `concurrency` pages at a time
+        while sending at most `requests_per_second` requests to any one host"""
+        urls = await asyncio.to_thread(self.find_work_pass_pages)
+        
+        # Limit to max_pages to avoid excessive scraping
+        urls_to_scrape = list(dict.fromkeys(urls[:max_pages]))
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        rate_limiter = HostRateLimiter(requests_per_second)
+        async with httpx.AsyncClient(http2=True, timeout=10, headers=self.HEADERS, follow_redirects=True) as client:
+            results = await asyncio.gather(
+                *[self._scrape_page_async(client, semaphore, rate_limiter, url) for url in urls_to_scrape]
+            )
+        
+        self.save_page_cache()
+        self.scraped_data = [data for data in results if data]
+        return self.scraped_data
+    
     def save_to_json(self, filename: str = "mom_data.json"):
         """Save scraped data to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_data, f, indent=2, ensure_ascii=False)
+        Path(filename).write_bytes(orjson.dumps(self.scraped_data, option=orjson.OPT_INDENT_2))
         logger.info(f"Saved {len(self.scraped_data)} pages to {filename}")
 
 
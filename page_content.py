@@ -0,0 +1,265 @@
+"""
+Static page content for the About Us and Methodology pages
+
+Kept in its own module so the large strings are built once at import time
+instead of on every Streamlit rerun.
+"""
+
+ABOUT_MD = """
+## Project Overview
+
+The Singapore Work Pass Assistant is an LLM-powered web application designed to help citizens 
+and foreign workers understand Singapore work passes by providing accurate, up-to-date information 
+from official Ministry of Manpower (MOM) sources.
+
+## Objectives
+
+1. **Consolidate Information**: Aggregate data from official MOM sources to provide a unified 
+   repository of work pass information
+
+2. **Personalize User Experience**: Allow users to provide context (nationality, salary range, etc.) 
+   to receive tailored guidance relevant to their specific scenarios
+
+3. **Enhance Understanding**: Generate interactive content, explanations, and responses to 
+   follow-up questions to facilitate deeper comprehension
+
+4. **Present Information Effectively**: Present information through various formats including 
+   text, tables, visualizations, and interactive forms
+
+## Data Sources
+
+All information is retrieved from official and publicly accessible sources:
+
+- **Ministry of Manpower Singapore (MOM)**: https://www.mom.gov.sg
+- **MOM Passes and Permits Portal**: https://www.mom.gov.sg/passes-and-permits
+
+The knowledge base is built by scraping and processing official MOM web pages to ensure 
+accuracy and reliability.
+
+## Features
+
+### 1. Chat Interface
+- Interactive Q&A powered by RAG (Retrieval-Augmented Generation)
+- Context-aware responses based on user profile
+- Source citations for transparency
+
+### 2. Intelligent Search
+- Semantic search across the knowledge base
+- Relevance-ranked results
+- Detailed document previews
+
+### 3. Personalized Guidance
+- User profile collection (nationality, current pass, salary range)
+- Contextualized responses
+- Scenario-specific information
+
+## Technology Stack
+
+- **Frontend**: Streamlit
+- **LLM**: OpenAI GPT-4o-mini
+- **Vector Database**: ChromaDB
+- **Embeddings**: OpenAI text-embedding-3-small
+- **RAG Framework**: LangChain
+
+## Work Pass Coverage
+
+The application covers information about:
+
+- Employment Pass (EP)
+- Personalised Employment Pass (PEP)
+- EntrePass
+- S Pass
+- Work Permits (various types)
+- Foreign Domestic Worker (FDW) permits
+- Training Employment Pass
+- Work Holiday Pass
+- Dependant's Pass
+- Long-Term Visit Pass (LTVP)
+- And other related passes and permits
+
+## Disclaimer
+
+This application provides information based on publicly available MOM sources. For official 
+applications, renewals, or specific queries, users should always refer to the official 
+MOM website or contact MOM directly.
+"""
+
+METHODOLOGY_MD = """
+## System Architecture
+
+The application uses a Retrieval-Augmented Generation (RAG) architecture to provide accurate 
+answers about Singapore work passes.
+
+### Use Case 1: Chat with Information
+
+**Process Flow:**
+
+1. User submits a question through the chat interface
+2. Optional user context (nationality, salary, etc.) is collected
+3. Question is enhanced with user context
+4. RAG engine performs semantic search in vector database
+5. Top 5 relevant document chunks are retrieved, reranked for diversity so near-duplicates don't crowd out other sources
+6. Retrieved context is passed to LLM with prompt template
+7. LLM generates answer based on retrieved context
+8. Answer and source citations are returned to user
+9. Conversation history is maintained for context
+
+<pre>
+┌─────────────┐
+│ User Query  │
+└──────┬──────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Collect User Context│
+│ (Optional)          │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Enhance Query       │
+│ with Context        │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Vector DB Search    │
+│ (Semantic Search)   │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Retrieve Top 5      │
+│ Relevant Chunks      │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ LLM Generation      │
+│ (with Context)      │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Return Answer +     │
+│ Source Citations    │
+└─────────────────────┘
+</pre>
+
+---
+
+### Use Case 2: Intelligent Search
+
+**Process Flow:**
+
+1. User enters search query
+2. Query is converted to embedding vector
+3. Similarity search performed in vector database
+4. Top K most relevant documents retrieved (default: 10)
+5. Results ranked by relevance score
+6. Documents displayed with metadata (title, URL, pass type, category)
+7. User can expand each result to view full content
+
+<pre>
+┌─────────────┐
+│ Search Query│
+└──────┬──────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Convert to          │
+│ Embedding Vector    │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Similarity Search   │
+│ in Vector DB        │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Rank by Relevance   │
+│ Score               │
+└──────┬──────────────┘
+       │
+       ▼
+┌─────────────────────┐
+│ Return Top K        │
+│ Results with        │
+│ Metadata            │
+└─────────────────────┘
+</pre>
+
+---
+
+### Knowledge Base Building Process
+
+**Data Flow:**
+
+1. **Web Scraping**: Scrape official MOM website pages
+2. **Data Processing**: Clean and structure scraped content
+3. **Categorization**: Automatically categorize by pass type and content type
+4. **Chunking**: Split documents into manageable chunks (1000 chars, 200 overlap)
+5. **Embedding**: Convert chunks to vector embeddings
+6. **Storage**: Store in ChromaDB vector database
+7. **Indexing**: Create searchable index for retrieval
+
+<pre>
+┌─────────────────┐
+│ MOM Website      │
+│ (mom.gov.sg)     │
+└────────┬─────────┘
+         │
+         ▼
+┌─────────────────┐
+│ Web Scraper      │
+│ (BeautifulSoup) │
+└────────┬─────────┘
+         │
+         ▼
+┌─────────────────┐
+│ Data Processor   │
+│ (Clean & Chunk)  │
+└────────┬─────────┘
+         │
+         ▼
+┌─────────────────┐
+│ Embedding       │
+│ (OpenAI API)    │
+└────────┬─────────┘
+         │
+         ▼
+┌─────────────────┐
+│ Vector Database │
+│ (ChromaDB)      │
+└─────────────────┘
+</pre>
+
+---
+
+### Implementation Details
+
+#### Technologies Used
+
+- **LangChain**: RAG framework and chain orchestration
+- **ChromaDB**: Vector database for semantic search
+- **OpenAI Embeddings**: text-embedding-3-small for document embeddings
+- **OpenAI GPT-4o-mini**: LLM for answer generation
+- **Streamlit**: Web application framework
+
+#### Key Parameters
+
+- **Chunk Size**: 1000 characters
+- **Chunk Overlap**: 200 characters
+- **Retrieval Count**: Top 5 chunks per query
+- **Temperature**: 0.3 (for consistent, factual responses)
+
+#### Prompt Engineering
+
+The system uses a custom prompt template that:
+- Instructs the LLM to use only provided context
+- Encourages citing sources
+- Handles cases where information is not available
+- Maintains a helpful, professional tone
+"""
@@ -0,0 +1,213 @@
+"""
+Semantic answer cache for the RAG engine
+"""
+import atexit
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import orjson
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """Cache RAG answers keyed on query embeddings so rephrased questions skip retrieval and generation"""
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float = 0.95,
+                 max_entries: int = 1000, ttl_seconds: float = 3600,
+                 cache_dir: Optional[str] = None, save_every: int = 50):
+        """
+        Initialize the cache, reloading saved answers from cache_dir if present
+
+        Args:
+            embed_fn: Function returning the embedding of a query string
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            max_entries: Maximum number of cached answers before the least recently used is evicted
+            ttl_seconds: Age after which a cached answer is discarded
+            cache_dir: Optional directory to persist the cache in, so it survives restarts
+            save_every: Number of inserts between saves to cache_dir
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.save_every = save_every
+
+        # Row i of keys is the unit-normalized embedding for entries[i], held at half precision -
+        # twice the entries per MB, and far below the gap between the threshold and a miss
+        self.keys = np.empty((0, 0), dtype=np.float16)
+        self.entries: List[Dict] = []
+        # (context, normalized question text) -> entry, so exact repeats are answered without embedding
+        self._exact: Dict[Tuple[str, str], Dict] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            self._load()
+            atexit.register(self.save)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a query and normalize it so cosine similarity is a plain dot product"""
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Case- and whitespace-insensitive form of a question for exact matching"""
+        return " ".join(text.lower().split())
+
+    def get_exact(self, text: str, context: str = "") -> Optional[Dict]:
+        """Return the cached result for this exact question (ignoring case and whitespace) and context, or None"""
+        with self._lock:
+            self._expire()
+            entry = self._exact.get((context, self.normalize(text)))
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            logger.info("Exact-match cache hit")
+            return entry["result"]
+
+    def get(self, query_vector: np.ndarray, context: str = "") -> Optional[Dict]:
+        """
+        Return the cached result for the most similar query, or None if nothing is close enough
+
+        Args:
+            query_vector: Normalized embedding of the question, from embed()
+            context: Only entries stored with exactly this context can match - answers are
+                personalised, so a similar question from a different profile must not reuse them
+        """
+        with self._lock:
+            self._expire()
+            # A different vector size means the embedding model changed and nothing can match
+            if not self.entries or self.keys.shape[1] != query_vector.shape[0]:
+                return None
+            candidates = [i for i, entry in enumerate(self.entries) if entry["context"] == context]
+            if not candidates:
+                return None
+
+            # Upcast for the matrix-vector product so numpy hands it to BLAS
+            similarities = self.keys[candidates].astype(np.float32) @ query_vector.astype(np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entry = self.entries[candidates[best]]
+            entry["last_used"] = time.time()
+            logger.info(f"Semantic cache hit (similarity {similarities[best]:.3f})")
+            return entry["result"]
+
+    def put(self, query_vector: np.ndarray, result: Dict, text: Optional[str] = None, context: str = ""):
+        """
+        Store a result under its query embedding, evicting the least recently used entry when full
+
+        Args:
+            query_vector: Normalized embedding of the question, from embed()
+            result: Query result to reuse
+            text: Optional question text, so exact repeats can be served by get_exact()
+            context: The user context the answer was personalised for
+        """
+        with self._lock:
+            self._expire()
+            if len(self.entries) >= self.max_entries:
+                lru_index = min(range(len(self.entries)), key=lambda i: self.entries[i]["last_used"])
+                self._remove([lru_index])
+
+            now = time.time()
+            row = query_vector.reshape(1, -1).astype(np.float16)
+            if self.entries and self.keys.shape[1] != row.shape[1]:
+                # Embedding model changed - old entries can never match again
+                self.keys = np.empty((0, 0), dtype=np.float16)
+                self.entries = []
+                self._exact = {}
+            self.keys = np.vstack([self.keys, row]) if self.entries else row
+            entry = {"result": result, "context": context, "created": now, "last_used": now}
+            if text is not None:
+                entry["text"] = self.normalize(text)
+                self._exact[(context, entry["text"])] = entry
+            self.entries.append(entry)
+
+            self._unsaved += 1
+            if self.cache_dir and self._unsaved >= self.save_every:
+                self._save()
+
+    def clear(self):
+        """Remove all cached answers"""
+        with self._lock:
+            self.keys = np.empty((0, 0), dtype=np.float16)
+            self.entries = []
+            self._exact = {}
+
+    def save(self):
+        """Write the cache to cache_dir"""
+        if not self.cache_dir:
+            return
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        """Atomically write keys and entries to cache_dir (caller must hold the lock)"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            keys_path = self.cache_dir / "answers.npz"
+            entries_path = self.cache_dir / "answers.jsonl"
+
+            # Write to temp files then rename, so a crash mid-write never leaves a corrupt cache
+            with open(keys_path.with_suffix(".tmp.npz"), "wb") as f:
+                np.savez_compressed(f, keys=self.keys)
+            entries_path.with_suffix(".tmp").write_bytes(
+                b"".join(orjson.dumps(entry) + b"\n" for entry in self.entries)
+            )
+            os.replace(keys_path.with_suffix(".tmp.npz"), keys_path)
+            os.replace(entries_path.with_suffix(".tmp"), entries_path)
+            self._unsaved = 0
+        except Exception as e:
+            logger.error(f"Error saving semantic cache: {str(e)}")
+
+    def _load(self):
+        """Reload a previously saved cache, dropping entries that expired while the app was down"""
+        keys_path = self.cache_dir / "answers.npz"
+        entries_path = self.cache_dir / "answers.jsonl"
+        if not keys_path.exists() or not entries_path.exists():
+            return
+
+        try:
+            keys = np.load(keys_path)["keys"]
+            entries = [orjson.loads(line) for line in entries_path.read_bytes().splitlines() if line]
+            if len(entries) != len(keys):
+                logger.warning("Semantic cache files are out of sync; starting with an empty cache")
+                return
+
+            # Entries saved before answers were keyed on context embedded the profile in the
+            # question, so they can't be matched safely - drop them
+            keep = [i for i, entry in enumerate(entries) if "context" in entry]
+            self.keys = keys[keep].astype(np.float16)
+            self.entries = [entries[i] for i in keep]
+            self._index_exact()
+            self._expire()
+            logger.info(f"Loaded {len(self.entries)} cached answers from {self.cache_dir}")
+        except Exception as e:
+            logger.error(f"Error loading semantic cache: {str(e)}")
+
+    def _expire(self):
+        """Drop entries older than the TTL (caller must hold the lock)"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [i for i, entry in enumerate(self.entries) if entry["created"] < cutoff]
+        if expired:
+            self._remove(expired)
+
+    def _remove(self, indices: List[int]):
+        """Remove entries by index (caller must hold the lock)"""
+        self.keys = np.delete(self.keys, indices, axis=0)
+        removed = set(indices)
+        self.entries = [entry for i, entry in enumerate(self.entries) if i not in removed]
+        self._index_exact()
+
+    def _index_exact(self):
+        """Rebuild the exact-match lookup from entries (caller must hold the lock)"""
+        self._exact = {(entry["context"], entry["text"]): entry for entry in self.entries if "text" in entry}
@@ -1,22 +1,45 @@
 """
 RAG (Retrieval-Augmented Generation) engine for the chatbot
 """
+import asyncio
 import os
-import sys
+import time
 from pathlib import Path
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_chroma import Chroma
+import numpy as np
+import orjson
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from typing import List, Dict, Tuple
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from typing import AsyncIterator, Iterator, List, Dict, Tuple
+from clients import create_llm, get_embeddings, get_llm, get_vector_store, new_async_http_client
+from vector_index import load_index
+from rag_cache import SemanticAnswerCache
 import config
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Retrieved chunks that share this many leading characters are treated as duplicates in the prompt
+CONTEXT_FINGERPRINT_CHARS = 256
+
+# Custom prompt template
+PROMPT_TEMPLATE = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""You are a helpful assistant that provides accurate information about Singapore work passes based on official Ministry of Manpower (MOM) sources.
+
+Use the following context from official MOM sources to answer the question. If the answer is not in the context, say so clearly and suggest the user visit the official MOM website for more information.
+
+Context from MOM sources:
+{context}
+
+Question: {question}
+
+Provide a clear, accurate, and helpful answer based on the context above. If relevant, mention the specific pass type(s) and include key details like eligibility requirements, application process, or fees if mentioned in the context.
+
+Answer:"""
+)
+
 class RAGEngine:
     """RAG engine for retrieving and generating responses about Singapore work passes"""
     
@@ -28,11 +51,11 @@ class RAGEngine:
             auto_build: If True, automatically build knowledge base if it doesn't exist
         """
         try:
-            # Initialize embeddings
-            self.embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",
-                openai_api_key=config.OPENAI_API_KEY
-            )
+            # Unique pass types / categories, scanned from the collection on first use
+            self._metadata_summary = None
+            
+            # Initialize embeddings (shared and cached so repeated queries skip the API)
+            self.embeddings = get_embeddings()
             
             # Load or build vector database
             if not os.path.exists(config.VECTOR_DB_PATH):
@@ -47,51 +70,36 @@ class RAGEngine:
             
             # Load vector store (either newly created or existing)
             if not hasattr(self, 'vector_store') or self.vector_store is None:
-                self.vector_store = Chroma(
-                    persist_directory=config.VECTOR_DB_PATH,
-                    embedding_function=self.embeddings,
-                    collection_name=config.COLLECTION_NAME
-                )
+                self.vector_store = get_vector_store()
             
-            # Initialize LLM
-            self.llm = ChatOpenAI(
-                model_name=config.OPENAI_MODEL,
-                temperature=0.3,
-                openai_api_key=config.OPENAI_API_KEY
-            )
+            # Initialize LLM (shared across engines in this process)
+            self.llm = get_llm()
+            # Async calls use this engine's own client, opened per event loop (see _get_async_llm)
+            self._async_http_client = None
+            self._async_llm = None
+            self._async_loop = None
             
-            # Create retriever
-            self.retriever = self.vector_store.as_retriever(
-                search_kwargs={"k": 5}  # Retrieve top 5 relevant chunks
+            # Retrieval queries the raw Chroma collection with our own (cached) query embedding,
+            # or an in-memory copy of it when one is configured (None = query Chroma)
+            self._collection = self.vector_store._collection
+            self.index = load_index(
+                config.VECTOR_SEARCH_BACKEND, self._collection, config.FAISS_HNSW_M, config.FAISS_INT8
             )
             
-            # Create custom prompt template
-            self.prompt_template = PromptTemplate(
-                input_variables=["context", "question"],
-                template="""You are a helpful assistant that provides accurate information about Singapore work passes based on official Ministry of Manpower (MOM) sources.
-
-Use the following context from official MOM sources to answer the question. If the answer is not in the context, say so clearly and suggest the user visit the official MOM website for more information.
-
-Context from MOM sources:
-{context}
-
-Question: {question}
-
-Provide a clear, accurate, and helpful answer based on the context above. If relevant, mention the specific pass type(s) and include key details like eligibility requirements, application process, or fees if mentioned in the context.
-
-Answer:"""
+            # Semantic answer cache - rephrasings of an answered question reuse its answer
+            self.answer_cache = SemanticAnswerCache(
+                self.embeddings.embed_query,
+                threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.SEMANTIC_CACHE_TTL,
+                cache_dir=config.SEMANTIC_CACHE_DIR,
+                save_every=config.SEMANTIC_CACHE_SAVE_EVERY
             )
             
-            # Create RAG chain using LCEL
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-            
-            self.qa_chain = (
-                {"context": self.retriever | format_docs, "question": RunnablePassthrough()}
-                | self.prompt_template
-                | self.llm
-                | StrOutputParser()
-            )
+            # Prompt template is compiled once at import time and shared. Every query path
+            # retrieves once itself and formats the prompt with _build_prompt, so the same
+            # documents back the answer and its sources
+            self.prompt_template = PROMPT_TEMPLATE
             
             logger.info("RAG engine initialized successfully")
             
@@ -112,9 +120,8 @@ Answer:"""
         
         try:
             # Import builder components
+            from knowledge_base.builder import KnowledgeBaseBuilder
             from knowledge_base.processor import DataProcessor
-            import json
-            import time
             
             logger.info(f"Loading processed data from {processed_file}...")
             
@@ -124,58 +131,12 @@ Answer:"""
             
             logger.info(f"Found {len(processed_chunks)} processed chunks. Creating vector database...")
             
-            # Convert to LangChain Documents
-            documents = []
-            for chunk in processed_chunks:
-                # Clean metadata - convert complex types to strings
-                metadata = chunk['metadata'].copy()
-                
-                # Convert headings list to string if it exists
-                if 'headings' in metadata and isinstance(metadata['headings'], list):
-                    headings_str = "; ".join([f"{h.get('level', '')}: {h.get('text', '')}" for h in metadata['headings']])
-                    metadata['headings'] = headings_str
-                
-                # Filter out any remaining complex metadata types
-                cleaned_metadata = {}
-                for key, value in metadata.items():
-                    if isinstance(value, (str, int, float, bool)) or value is None:
-                        cleaned_metadata[key] = value
-                    elif isinstance(value, list):
-                        cleaned_metadata[key] = json.dumps(value) if value else ""
-                    elif isinstance(value, dict):
-                        cleaned_metadata[key] = json.dumps(value)
-                
-                doc = Document(
-                    page_content=chunk['text'],
-                    metadata=cleaned_metadata
-                )
-                documents.append(doc)
-            
-            # Create vector store with retry logic for rate limits
-            max_retries = 3
-            retry_delay = 5  # seconds
-            
-            for attempt in range(max_retries):
-                try:
-                    logger.info(f"Creating vector database (attempt {attempt + 1}/{max_retries})...")
-                    self.vector_store = Chroma.from_documents(
-                        documents=documents,
-                        embedding=self.embeddings,
-                        persist_directory=config.VECTOR_DB_PATH,
-                        collection_name=config.COLLECTION_NAME
-                    )
-                    logger.info(f"Successfully created vector database with {len(documents)} documents")
-                    break
-                except Exception as e:
-                    if "429" in str(e) or "rate" in str(e).lower() or "quota" in str(e).lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Rate limit hit. Waiting {retry_delay} seconds before retry...")
-                            time.sleep(retry_delay)
-                            retry_delay *= 2  # Exponential backoff
-                        else:
-                            raise Exception(f"Failed after {max_retries} attempts due to rate limits. Please check your OpenAI API quota.")
-                    else:
-                        raise
+            # Same path as builder.py: metadata is normalized through ChunkMeta and chunks are
+            # embedded in parallel batches (with rate-limit backoff) before a bulk upsert
+            builder = KnowledgeBaseBuilder()
+            builder.create_vector_db(processed_chunks)
+            self.vector_store = builder.vector_store
+            self.invalidate_metadata_cache()
             
         except Exception as e:
             logger.error(f"Error auto-building knowledge base: {str(e)}")
@@ -184,6 +145,20 @@ Answer:"""
                 "Please run 'python knowledge_base/builder.py --from-file processed_knowledge_base.json' manually."
             )
     
+    @staticmethod
+    def context_key(user_context: Dict = None) -> str:
+        """The user's profile as canonical text - sorted, so the same profile always yields the same string"""
+        if not user_context:
+            return ""
+        return ", ".join(f"{k}: {v}" for k, v in sorted(user_context.items()) if v)
+    
+    def enhance_question(self, question: str, user_context: Dict = None) -> str:
+        """Append the user's profile to the question so retrieval and generation can use it"""
+        context_str = self.context_key(user_context)
+        if context_str:
+            return f"{question} (User context: {context_str})"
+        return question
+    
     def query(self, question: str, user_context: Dict = None) -> Dict:
         """
         Query the RAG system with a question
@@ -196,58 +171,382 @@ Answer:"""
             Dictionary with answer, sources, and metadata
         """
         try:
-            # Enhance question with user context if provided
-            enhanced_question = question
-            if user_context:
-                context_str = ", ".join([f"{k}: {v}" for k, v in user_context.items() if v])
-                if context_str:
-                    enhanced_question = f"{question} (User context: {context_str})"
-            
-            # Retrieve relevant documents for source citations
-            docs = self.retriever.invoke(enhanced_question)
-            
-            # Query the chain
-            answer = self.qa_chain.invoke(enhanced_question)
-            
-            # Extract sources from retrieved documents
-            sources = []
-            for doc in docs:
-                source_info = {
-                    "title": doc.metadata.get("title", "Unknown"),
-                    "url": doc.metadata.get("source", ""),
-                    "pass_type": doc.metadata.get("pass_type", "General"),
-                    "category": doc.metadata.get("category", "general")
-                }
-                sources.append(source_info)
-            
-            return {
-                "answer": answer,
-                "sources": sources,
-                "question": question
-            }
+            enhanced_question = self.enhance_question(question, user_context)
+            context = self.context_key(user_context)
+            
+            # A repeated question skips even the embedding; a semantically equivalent one
+            # skips retrieval and generation. Cached answers are personalised, so both only
+            # match answers given for exactly the same profile. The one embedding of the
+            # enhanced question serves both the cache lookup and retrieval
+            cached = self.answer_cache.get_exact(question, context)
+            if cached is None:
+                query_vector = self.answer_cache.embed(enhanced_question)
+                cached = self.answer_cache.get(query_vector, context)
+            if cached is not None:
+                return {**cached, "question": question}
+            
+            # Retrieve once - the same documents feed the prompt and the source citations
+            docs = self._retrieve_by_vector(query_vector)
+            
+            # Generate the answer from the retrieved context
+            answer = self.llm.invoke(self._build_prompt(docs, enhanced_question)).content
+            sources = self._format_sources(docs)
+            
+            return self._finish_query(question, context, answer, sources, query_vector)
+            
+        except Exception as e:
+            return self._error_result(question, e)
+    
+    async def aquery(self, question: str, user_context: Dict = None) -> Dict:
+        """
+        Async version of query(), so many questions can be in flight at once
+        
+        Args:
+            question: User's question
+            user_context: Optional user context (e.g., nationality, salary, etc.)
+        
+        Returns:
+            Dictionary with answer, sources, and metadata
+        """
+        try:
+            enhanced_question = self.enhance_question(question, user_context)
+            context = self.context_key(user_context)
+            
+            # Embedding and retrieval use the shared sync clients, so run them off the event loop
+            cached = self.answer_cache.get_exact(question, context)
+            if cached is None:
+                query_vector = await asyncio.to_thread(self.answer_cache.embed, enhanced_question)
+                cached = self.answer_cache.get(query_vector, context)
+            if cached is not None:
+                return {**cached, "question": question}
+            
+            docs = await asyncio.to_thread(self._retrieve_by_vector, query_vector)
+            
+            # Shape the sources while the LLM request is in flight - yielding once lets the
+            # task run up to its first network wait before the sources are built
+            answer_task = asyncio.create_task(self._get_async_llm().ainvoke(self._build_prompt(docs, enhanced_question)))
+            await asyncio.sleep(0)
+            sources = self._format_sources(docs)
+            answer = (await answer_task).content
+            
+            return self._finish_query(question, context, answer, sources, query_vector)
+            
+        except Exception as e:
+            return self._error_result(question, e)
+    
+    async def aquery_batch(self, questions: List[str], user_context: Dict = None, concurrency: int = 32) -> List[Dict]:
+        """
+        Answer several questions concurrently
+        
+        Args:
+            questions: Questions to answer
+            user_context: Optional user context applied to every question
+            concurrency: Maximum number of questions in flight at once
+        
+        Returns:
+            One result dictionary per question, in the same order as questions
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def bounded_query(question: str) -> Dict:
+            async with semaphore:
+                return await self.aquery(question, user_context)
+        
+        return await asyncio.gather(*[bounded_query(question) for question in questions])
+    
+    def _get_async_llm(self):
+        """Chat model on this engine's async HTTP client, (re)opened for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_llm is None or self._async_loop is not loop:
+            # Pooled connections can't move between event loops - a client left over from a
+            # loop that has since finished is dropped, since it can no longer be awaited to close
+            self._async_http_client = new_async_http_client()
+            self._async_llm = create_llm(http_async_client=self._async_http_client)
+            self._async_loop = loop
+        return self._async_llm
+    
+    async def aclose(self):
+        """
+        Close this engine's async HTTP client, e.g. before the event loop that used it shuts down
+        
+        Later async calls open a new client, so this is safe to call after every asyncio.run().
+        """
+        if self._async_http_client is not None:
+            await self._async_http_client.aclose()
+            self._async_http_client = None
+            self._async_llm = None
+            self._async_loop = None
+    
+    def warm_up(self, questions: List[str]):
+        """
+        Load the vector store into memory and answer common questions, so the first real
+        queries don't pay for cold pages, connections and caches
+        
+        Args:
+            questions: Questions to answer ahead of time - their answers land in the answer cache
+        """
+        start = time.perf_counter()
+        # Chroma loads its SQLite pages and HNSW graph on first query - only worth doing
+        # when queries go to Chroma rather than an in-memory index
+        if self.index is None:
+            try:
+                self.vector_store.similarity_search("warmup", k=1)
+            except Exception as e:
+                logger.warning(f"Vector store warm-up failed: {str(e)}")
+            logger.info(f"Vector store warmed up in {time.perf_counter() - start:.2f}s")
+        
+        for question in questions:
+            try:
+                self.search(question, top_k=5)
+                self.query(question)
+            except Exception as e:
+                logger.warning(f"Warm-up query failed for '{question}': {str(e)}")
+        logger.info(f"Warm-up finished for {len(questions)} questions in {time.perf_counter() - start:.2f}s")
+    
+    def _finish_query(self, question: str, context: str, answer: str, sources: List[Dict],
+                      query_vector: np.ndarray) -> Dict:
+        """Build a query result and add it to the answer cache"""
+        result = {
+            "answer": answer,
+            "sources": sources,
+            "question": question
+        }
+        # Answers without sources had nothing to ground them and should not be reused
+        if result["sources"]:
+            self.answer_cache.put(query_vector, result, text=question, context=context)
+        return result
+    
+    @staticmethod
+    def _error_result(question: str, error: Exception) -> Dict:
+        """Result returned in place of an answer when a query fails"""
+        logger.error(f"Error querying RAG engine: {str(error)}")
+        return {
+            "answer": f"I encountered an error: {str(error)}. Please try again.",
+            "sources": [],
+            "question": question
+        }
+    
+    def stream_query(self, question: str, user_context: Dict = None) -> Tuple[Iterator[str], List[Dict]]:
+        """
+        Query the RAG system and stream the answer as it is generated
+        
+        Args:
+            question: User's question
+            user_context: Optional user context (e.g., nationality, salary, etc.)
+        
+        Returns:
+            Tuple of (iterator over answer text chunks, list of sources)
+        """
+        try:
+            enhanced_question = self.enhance_question(question, user_context)
+            context = self.context_key(user_context)
+            
+            # A cached answer is returned whole as a single chunk
+            cached = self.answer_cache.get_exact(question, context)
+            if cached is None:
+                query_vector = self.answer_cache.embed(enhanced_question)
+                cached = self.answer_cache.get(query_vector, context)
+            if cached is not None:
+                return iter([cached["answer"]]), cached["sources"]
             
+            docs = self._retrieve_by_vector(query_vector)
         except Exception as e:
             logger.error(f"Error querying RAG engine: {str(e)}")
-            return {
-                "answer": f"I encountered an error: {str(e)}. Please try again.",
-                "sources": [],
-                "question": question
+            return iter([f"I encountered an error: {str(e)}. Please try again."]), []
+        
+        sources = self._format_sources(docs)
+        return self._stream_answer(docs, enhanced_question, query_vector, question, context, sources), sources
+    
+    async def astream_query(self, question: str, user_context: Dict = None) -> Tuple[AsyncIterator[str], List[Dict]]:
+        """
+        Async version of stream_query(), for serving answers over an async transport (SSE, WebSocket)
+        
+        Args:
+            question: User's question
+            user_context: Optional user context (e.g., nationality, salary, etc.)
+        
+        Returns:
+            Tuple of (async iterator over answer text chunks, list of sources)
+        """
+        try:
+            enhanced_question = self.enhance_question(question, user_context)
+            context = self.context_key(user_context)
+            
+            # Embedding and retrieval use the shared sync clients, so run them off the event loop
+            cached = self.answer_cache.get_exact(question, context)
+            if cached is None:
+                query_vector = await asyncio.to_thread(self.answer_cache.embed, enhanced_question)
+                cached = self.answer_cache.get(query_vector, context)
+            if cached is not None:
+                return self._aiter_once(cached["answer"]), cached["sources"]
+            
+            docs = await asyncio.to_thread(self._retrieve_by_vector, query_vector)
+        except Exception as e:
+            logger.error(f"Error querying RAG engine: {str(e)}")
+            return self._aiter_once(f"I encountered an error: {str(e)}. Please try again."), []
+        
+        sources = self._format_sources(docs)
+        return self._astream_answer(docs, enhanced_question, query_vector, question, context, sources), sources
+    
+    def _retrieve(self, question: str, k: int = 5) -> List[Document]:
+        """Retrieve the top k chunks for a question, diversified with MMR when configured"""
+        return self._retrieve_by_vector(self.embeddings.embed_query(question), k)
+    
+    def _retrieve_by_vector(self, query_embedding: List[float], k: int = 5) -> List[Document]:
+        """Same as _retrieve(), for a question that is already embedded"""
+        if config.RETRIEVAL_MMR:
+            docs = self._mmr_search_with_score(
+                query_embedding, k, config.RETRIEVAL_FETCH_K, config.RETRIEVAL_MMR_LAMBDA
+            )
+        else:
+            docs = self._similarity_search_with_score(query_embedding, k)
+        return [doc for doc, _ in docs]
+    
+    def _similarity_search_with_score(self, query_embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Nearest chunks to an embedding, from the in-memory index when loaded, else straight from the collection"""
+        if self.index is not None:
+            return self.index.similarity_search_with_score(query_embedding, k=k)
+        
+        results = self._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            (Document(page_content=text, metadata=metadata or {}), distance)
+            for text, metadata, distance in zip(
+                results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+    
+    def _mmr_search_with_score(self, query_embedding: List[float], k: int, fetch_k: int,
+                               lambda_mult: float = 0.5) -> List[Tuple[Document, float]]:
+        """
+        Rerank the fetch_k nearest chunks with maximal marginal relevance, keeping each result's distance
+        
+        Args:
+            query_embedding: Query embedding
+            k: Number of results to return
+            fetch_k: Number of nearest candidates to choose from
+            lambda_mult: 1 ranks purely by relevance, 0 purely by diversity
+        
+        Returns:
+            List of (document, cosine distance) pairs in MMR order
+        """
+        if self.index is not None:
+            candidates, vectors = self.index.similarity_search_with_vectors(query_embedding, k=fetch_k)
+        else:
+            results = self._collection.query(
+                query_embeddings=[query_embedding],
+                n_results=fetch_k,
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            candidates = [
+                (Document(page_content=text, metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(
+                    results["documents"][0], results["metadatas"][0], results["distances"][0]
+                )
+            ]
+            vectors = results["embeddings"][0]
+        if not candidates:
+            return []
+        
+        selected = maximal_marginal_relevance(
+            np.array(query_embedding, dtype=np.float32), vectors, lambda_mult=lambda_mult, k=k
+        )
+        return [candidates[i] for i in selected]
+    
+    def _build_prompt(self, docs: List[Document], question: str) -> str:
+        """Fill the prompt template with the retrieved context and the question"""
+        return self.prompt_template.format(context=self._format_docs(docs), question=question)
+    
+    def _stream_answer(self, docs: List[Document], enhanced_question: str, query_vector: np.ndarray,
+                       question: str, context: str, sources: List[Dict]) -> Iterator[str]:
+        """Stream the LLM answer for already-retrieved documents, caching it once fully generated"""
+        parts = []
+        try:
+            for chunk in self.llm.stream(self._build_prompt(docs, enhanced_question)):
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield f"I encountered an error: {str(e)}. Please try again."
+            return
+        
+        if sources:
+            result = {"answer": "".join(parts), "sources": sources, "question": question}
+            self.answer_cache.put(query_vector, result, text=question, context=context)
+    
+    async def _astream_answer(self, docs: List[Document], enhanced_question: str, query_vector: np.ndarray,
+                              question: str, context: str, sources: List[Dict]) -> AsyncIterator[str]:
+        """Async version of _stream_answer()"""
+        parts = []
+        try:
+            async for chunk in self._get_async_llm().astream(self._build_prompt(docs, enhanced_question)):
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield f"I encountered an error: {str(e)}. Please try again."
+            return
+        
+        if sources:
+            result = {"answer": "".join(parts), "sources": sources, "question": question}
+            self.answer_cache.put(query_vector, result, text=question, context=context)
+    
+    @staticmethod
+    async def _aiter_once(text: str) -> AsyncIterator[str]:
+        """Async iterator yielding a single chunk, for cached answers and errors"""
+        yield text
+    
+    @staticmethod
+    def _format_docs(docs: List[Document]) -> str:
+        """Join retrieved documents into the prompt context, skipping near-duplicates"""
+        # Chunks whose opening text matches one already included (e.g. the same section
+        # scraped from two URLs) add tokens to the prompt without adding information
+        seen = set()
+        unique_texts = []
+        for doc in docs:
+            fingerprint = " ".join(doc.page_content[:CONTEXT_FINGERPRINT_CHARS].split()).lower()
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                unique_texts.append(doc.page_content)
+        return "\n\n".join(unique_texts)
+    
+    @staticmethod
+    def _format_sources(docs: List[Document]) -> List[Dict]:
+        """Extract source citations from retrieved documents"""
+        sources = []
+        for doc in docs:
+            source_info = {
+                "title": doc.metadata.get("title", "Unknown"),
+                "url": doc.metadata.get("source", ""),
+                "pass_type": doc.metadata.get("pass_type", "General"),
+                "category": doc.metadata.get("category", "general")
             }
+            sources.append(source_info)
+        return sources
     
-    def search(self, query: str, top_k: int = 10) -> List[Dict]:
+    def search(self, query: str, top_k: int = 10, diverse: bool = False) -> List[Dict]:
         """
         Search the knowledge base and return relevant documents
         
         Args:
             query: Search query
             top_k: Number of results to return
+            diverse: If True, rerank a wider candidate set with maximal marginal relevance
+                so near-duplicate chunks (e.g. from the same page) don't crowd out other results
         
         Returns:
             List of relevant documents with metadata
         """
         try:
             # Search vector store
-            docs = self.vector_store.similarity_search_with_score(query, k=top_k)
+            query_embedding = self.embeddings.embed_query(query)
+            if diverse:
+                docs = self._mmr_search_with_score(query_embedding, top_k, fetch_k=top_k * 4)
+            else:
+                docs = self._similarity_search_with_score(query_embedding, top_k)
             
             results = []
             for doc, score in docs:
@@ -266,20 +565,32 @@ Answer:"""
             logger.error(f"Error searching knowledge base: {str(e)}")
             return []
     
+    def _load_metadata_summary(self) -> Dict[str, List[str]]:
+        """Load the unique pass types and categories once, from the summary file the builder writes"""
+        if self._metadata_summary is None:
+            summary_path = Path(config.METADATA_SUMMARY_PATH)
+            if summary_path.exists():
+                self._metadata_summary = orjson.loads(summary_path.read_bytes())
+            else:
+                # Databases built before the summary file existed - scan the metadata instead
+                from knowledge_base.processor import summarize_metadata
+                
+                # The in-memory index already holds every row's metadata, so only scan Chroma without it
+                if self.index is not None:
+                    all_metadata = self.index.metadatas
+                else:
+                    all_metadata = self._collection.get(include=["metadatas"])["metadatas"]
+                self._metadata_summary = summarize_metadata(metadata or {} for metadata in all_metadata)
+        return self._metadata_summary
+    
+    def invalidate_metadata_cache(self):
+        """Forget memoized pass types and categories, e.g. after the knowledge base is rebuilt"""
+        self._metadata_summary = None
+    
     def get_pass_types(self) -> List[str]:
         """Get list of all unique pass types in the knowledge base"""
         try:
-            # Get all documents metadata
-            collection = self.vector_store._collection
-            all_metadata = collection.get()["metadatas"]
-            
-            pass_types = set()
-            for metadata in all_metadata:
-                pass_type = metadata.get("pass_type", "General")
-                if pass_type and pass_type != "General":
-                    pass_types.add(pass_type)
-            
-            return sorted(list(pass_types))
+            return list(self._load_metadata_summary()["pass_types"])
             
         except Exception as e:
             logger.error(f"Error getting pass types: {str(e)}")
@@ -288,16 +599,7 @@ Answer:"""
     def get_categories(self) -> List[str]:
         """Get list of all unique categories in the knowledge base"""
         try:
-            collection = self.vector_store._collection
-            all_metadata = collection.get()["metadatas"]
-            
-            categories = set()
-            for metadata in all_metadata:
-                category = metadata.get("category", "general")
-                if category:
-                    categories.add(category)
-            
-            return sorted(list(categories))
+            return list(self._load_metadata_summary()["categories"])
             
         except Exception as e:
             logger.error(f"Error getting categories: {str(e)}")
@@ -0,0 +1,183 @@
+"""
+In-memory copies of the Chroma collection for fast search on small knowledge bases
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _read_collection(collection) -> Tuple[np.ndarray, List[str], List[dict]]:
+    """Fetch every embedding, document and metadata row from a Chroma collection"""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    return data["embeddings"], data["documents"], [metadata or {} for metadata in data["metadatas"]]
+
+def _unit_rows(vectors, count: int) -> np.ndarray:
+    """Float32 copy of vectors with each row scaled to unit length"""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(count, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def _unit_query(query_vector: List[float], dimensions: int) -> np.ndarray:
+    """Float32 unit-length copy of a query vector, checked against the index size"""
+    query = np.asarray(query_vector, dtype=np.float32)
+    if query.shape[0] != dimensions:
+        raise ValueError(f"Query has {query.shape[0]} dimensions but the index has {dimensions}")
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+def load_index(backend: str, collection, hnsw_m: int = 32, faiss_int8: bool = False) -> Optional["InMemoryIndex"]:
+    """
+    Build the search index for a backend name from config.VECTOR_SEARCH_BACKEND
+
+    Args:
+        backend: "memory", "faiss" or "chroma"
+        collection: Chroma collection to load vectors from
+        hnsw_m: Graph degree for the FAISS HNSW index
+        faiss_int8: Store the FAISS index's vectors as 8-bit scalar-quantized codes
+
+    Returns:
+        An index with similarity_search_with_score, or None to query Chroma directly
+    """
+    if backend not in ("memory", "faiss", "chroma"):
+        raise ValueError(f"Unknown vector search backend: {backend}")
+    # Nothing to load yet (e.g. after a failed build) - query Chroma until the engine is recreated
+    if backend == "chroma" or collection.count() == 0:
+        return None
+    if backend == "memory":
+        return InMemoryIndex.from_collection(collection)
+    return FaissIndex.from_collection(collection, hnsw_m=hnsw_m, int8=faiss_int8)
+
+class InMemoryIndex:
+    """Unit-normalized float32 vectors, documents and metadata held in RAM and searched with one matrix product"""
+
+    def __init__(self, vectors: np.ndarray, documents: List[str], metadatas: List[dict]):
+        """
+        Normalize and store the collection
+
+        Args:
+            vectors: Float embeddings, one row per document
+            documents: Document texts, in the same order as vectors
+            metadatas: Document metadata, in the same order as vectors
+        """
+        # Kept as float32 so the product goes straight to BLAS - a quantized matrix would be
+        # cast to a full-size float32 temporary on every query, costing more time and no less memory
+        self.vectors = _unit_rows(vectors, len(documents))
+        self.documents = documents
+        self.metadatas = metadatas
+
+    @classmethod
+    def from_collection(cls, collection) -> "InMemoryIndex":
+        """Load every embedding, document and metadata row from a Chroma collection"""
+        index = cls(*_read_collection(collection))
+        logger.info(f"Loaded {len(index)} vectors into the in-memory index ({index.vectors.nbytes / 1e6:.1f} MB)")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def similarity_search_with_score(self, query_vector: List[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Exact nearest-neighbour search by cosine similarity
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results to return
+
+        Returns:
+            List of (document, cosine distance) pairs, closest first - the same scores Chroma returns
+        """
+        return self.similarity_search_with_vectors(query_vector, k)[0]
+
+    def similarity_search_with_vectors(self, query_vector: List[float], k: int = 5) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        """
+        Like similarity_search_with_score, also returning each result's (normalized) vector, e.g. for MMR
+
+        Returns:
+            Tuple of ((document, cosine distance) pairs, matrix with one vector per result)
+        """
+        query = _unit_query(query_vector, self.vectors.shape[1])
+        similarities = self.vectors @ query
+        k = min(k, len(self))
+        # argpartition finds the top k without sorting the whole collection
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        results = [
+            (Document(page_content=self.documents[i], metadata=self.metadatas[i]), float(1 - similarities[i]))
+            for i in top
+        ]
+        return results, self.vectors[top]
+
+class FaissIndex:
+    """FAISS HNSW graph over the collection's vectors, for knowledge bases too large for exact search"""
+
+    def __init__(self, vectors: np.ndarray, documents: List[str], metadatas: List[dict], hnsw_m: int = 32,
+                 int8: bool = False):
+        """
+        Build the HNSW graph
+
+        Args:
+            vectors: Float embeddings, one row per document
+            documents: Document texts, in the same order as vectors
+            metadatas: Document metadata, in the same order as vectors
+            hnsw_m: Graph degree - higher improves recall at the cost of memory and build time
+            int8: Store vectors as 8-bit scalar-quantized codes (4x smaller) instead of float32
+        """
+        # Optional dependency, only needed when this backend is selected
+        import faiss
+
+        unit = _unit_rows(vectors, len(documents))
+        # Inner product on unit vectors is cosine similarity
+        if int8:
+            self.index = faiss.IndexHNSWSQ(
+                unit.shape[1], faiss.ScalarQuantizer.QT_8bit, hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            # The quantizer learns each dimension's range from the vectors it will store
+            self.index.train(unit)
+        else:
+            self.index = faiss.IndexHNSWFlat(unit.shape[1], hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        self.index.add(unit)
+        self.documents = documents
+        self.metadatas = metadatas
+
+    @classmethod
+    def from_collection(cls, collection, hnsw_m: int = 32, int8: bool = False) -> "FaissIndex":
+        """Load every embedding, document and metadata row from a Chroma collection"""
+        index = cls(*_read_collection(collection), hnsw_m=hnsw_m, int8=int8)
+        logger.info(f"Loaded {len(index)} vectors into the FAISS HNSW index")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def similarity_search_with_score(self, query_vector: List[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Approximate nearest-neighbour search by cosine similarity
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results to return
+
+        Returns:
+            List of (document, cosine distance) pairs, closest first - the same scores Chroma returns
+        """
+        return self.similarity_search_with_vectors(query_vector, k)[0]
+
+    def similarity_search_with_vectors(self, query_vector: List[float], k: int = 5) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        """
+        Like similarity_search_with_score, also returning each result's (reconstructed) vector, e.g. for MMR
+
+        Returns:
+            Tuple of ((document, cosine distance) pairs, matrix with one vector per result)
+        """
+        query = _unit_query(query_vector, self.index.d)
+        similarities, ids = self.index.search(query.reshape(1, -1), min(k, len(self)))
+        found = ids[0] != -1
+        similarities, ids = similarities[0][found], ids[0][found]
+        results = [
+            (Document(page_content=self.documents[i], metadata=self.metadatas[i]), float(1 - similarity))
+            for similarity, i in zip(similarities, ids)
+        ]
+        return results, self.index.reconstruct_batch(ids)